@@ -1,20 +1,8 @@
-import gspread
-import time
-from oauth2client.service_account import ServiceAccountCredentials
+from ims_backend import SHEET_IDS, open_backend
 
-# === 1. SETUP AUTHENTICATION ===
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
-
-creds = ServiceAccountCredentials.from_json_keyfile_name("imscredentials.json", scope)
-client = gspread.authorize(creds)
-
-# === 2. OPEN THE GOOGLE SHEET ===
+# === 1 & 2. AUTHENTICATE AND OPEN THE GOOGLE SHEET ===
 sheet_name = "LW FILES"
-spreadsheet = client.open(sheet_name)
+backend = open_backend(SHEET_IDS[sheet_name])
 
 # === 3. DEFINE SHEET STRUCTURES ===
 sheet_definitions = {
@@ -64,12 +52,10 @@ sheet_definitions = {
     "LW 447": ["Date", "Cylinder No", "Shop", "Company", "Returned Date", "Qty (cu.m)"]
 }
 
-# === 4. CREATE SHEETS WITH DELAY ===
+# === 4. CREATE SHEETS (paced by the shared API quota bucket) ===
 for tab_name, headers in sheet_definitions.items():
     try:
-        worksheet = spreadsheet.add_worksheet(title=tab_name, rows="100", cols=str(len(headers)))
-        worksheet.append_row(headers)
+        backend.add_worksheet(tab_name, headers, rows=100)
         print(f"✅ Created sheet: {tab_name}")
-        time.sleep(1.5)  # Wait to avoid API rate limit
     except Exception as e:
         print(f"⚠️ Sheet {tab_name} may already exist or error: {e}")
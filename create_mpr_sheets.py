@@ -1,20 +1,8 @@
 import json
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from ims_backend import SHEET_IDS, open_backend
 
-# === 1. Google Sheets Setup ===
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
-
-creds = ServiceAccountCredentials.from_json_keyfile_name("imscredentials.json", scope)
-client = gspread.authorize(creds)
-
-# === 2. Open M&PR Google Sheet ===
-mpr_sheet_id = "17KL-cKMJNGncAJngla_eX6aVdzvoihbdpgOJqOiGycc"
-spreadsheet = client.open_by_key(mpr_sheet_id)
+# === 1 & 2. Open M&PR Google Sheet ===
+backend = open_backend(SHEET_IDS["M&PR FILES"])
 
 # === 3. Load M&PR Config ===
 with open("forms_mpr_configs.json", "r", encoding="utf-8") as f:
@@ -24,12 +12,13 @@ with open("forms_mpr_configs.json", "r", encoding="utf-8") as f:
 created = []
 skipped = []
 
+existing = set(backend.list_worksheets())
+
 for sheet_name, config in form_configs.items():
     try:
-        if sheet_name not in [ws.title for ws in spreadsheet.worksheets()]:
-            worksheet = spreadsheet.add_worksheet(title=sheet_name, rows="100", cols="30")
+        if sheet_name not in existing:
             headers = config.get("fields", []) + config.get("signatures", [])
-            worksheet.append_row(headers)
+            backend.add_worksheet(sheet_name, headers, rows=100)
             created.append(sheet_name)
         else:
             skipped.append(sheet_name)
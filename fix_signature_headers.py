@@ -1,29 +1,22 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from ims_backend import SHEET_IDS, open_backend, rowcol_to_a1
 
 # Setup
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
-
-creds = ServiceAccountCredentials.from_json_keyfile_name("imscredentials.json", scope)
-client = gspread.authorize(creds)
-spreadsheet = client.open("LW FILES")
+backend = open_backend(SHEET_IDS["LW FILES"])
+sheet_names = backend.list_worksheets()
 
 updated_sheets = []
 
-# Loop through all sheets
-for worksheet in spreadsheet.worksheets():
+# Read every header row in one request, then loop through all sheets
+all_headers = backend.batch_get([(name, "1:1") for name in sheet_names])
+for name, grid in zip(sheet_names, all_headers):
     try:
-        headers = worksheet.row_values(1)
+        headers = grid[0] if grid else []
         if "Signed by Officer" in headers:
-            index = headers.index("Signed by Officer") + 1  # gspread is 1-indexed
-            worksheet.update_cell(1, index, "Signed by Controlling Officer")
-            updated_sheets.append(worksheet.title)
+            index = headers.index("Signed by Officer") + 1  # A1 columns are 1-indexed
+            backend.update_range(name, rowcol_to_a1(1, index), [["Signed by Controlling Officer"]])
+            updated_sheets.append(name)
     except Exception as e:
-        print(f"Error in {worksheet.title}: {e}")
+        print(f"Error in {name}: {e}")
 
 # Report
 if updated_sheets:
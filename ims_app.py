@@ -1,13 +1,23 @@
 import streamlit as st
 st.set_page_config(page_title="IMS Form Entry", layout="wide")
 
-import gspread, json, pandas as pd, time, hashlib, functools, random, re, unicodedata
-from oauth2client.service_account import ServiceAccountCredentials
-from datetime import datetime
+import json, os, numpy as np, pandas as pd, time, hashlib, functools, random, math
+from datetime import datetime, date
 from io import BytesIO
-from jinja2 import Template
-from xhtml2pdf import pisa
-from gspread.utils import rowcol_to_a1
+from ims_mirror import SheetMirror, MirrorSync, TTLCache
+from ims_frames import (frame_from_grid, cell_diff, SearchIndex, FILTER_OPS, filter_kind, filter_mask,
+                        condition_mask, stale_cells, stale_rows, unique_headers)
+from ims_writes import WriteQueue
+from ims_jobs import JobStore, start_worker, DONE, ERROR
+from ims_nightly import archived_pdf
+from ims_pdf import (PdfError, row_pdf, table_pdf, parallel_table_pdf, pdf_pool, batch_row_pdfs, zip_pdfs, merge_pdfs,
+                     PdfCache, pdf_key, fast_table_pdf)
+from ims_schema import (bind_schema, diff_config_vs_sheet, expected_headers_from_config, prepare_import,
+                        SIGNED, ConfigRegistry)
+from ims_quota import shared_bucket, BACKGROUND
+from ims_scheduler import ApiScheduler, FetchEngine, retrying
+from ims_backend import (SHEET_IDS, GoogleSheetsBackend, LocalBackend, google_client,
+                         rowcol_to_a1, cell_ranges)
 
 # =========================
 # GLOBAL STYLE (beautify)
@@ -125,18 +135,12 @@ with st.sidebar:
 # =========================
 require_permission("read")
 
-sheet_choice = st.sidebar.selectbox("Choose File Type", ["LW FILES", "M&PR FILES"])
-SHEET_IDS = {
-    "LW FILES": "1wxntHZp4xEQWCmLAt2TVF8ohG6uHuvV_3QbaK7wSwGw",
-    "M&PR FILES": "17KL-cKMJNGncAJngla_eX6aVdzvoihbdpgOJqOiGycc",
-}
+sheet_choice = st.sidebar.selectbox("Choose File Type", list(SHEET_IDS))
 GOOGLE_SHEET_ID = SHEET_IDS[sheet_choice]
 
-SCOPE = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive",
-]
+# "google" (default) or "local" (SQLite primary; Google Sheets only as export target)
+BACKEND_KIND = st.secrets.get("IMS_BACKEND", "google")
+LOCAL_DB_PATH = st.secrets.get("IMS_LOCAL_DB_PATH", "ims_local.sqlite3")
 
 if "IMS_CREDENTIALS_JSON" in st.secrets:
     with open("temp_creds.json","w") as f: json.dump(json.loads(st.secrets["IMS_CREDENTIALS_JSON"]), f)
@@ -184,28 +188,64 @@ def with_backoff(max_retries=4, base=1.0, mult=2.0, max_sleep=6.0):
         return wrapper
     return deco
 
+QUOTA_PER_MINUTE = int(st.secrets.get("IMS_QUOTA_PER_MINUTE", 40))
+QUOTA_DB_PATH = st.secrets.get("IMS_QUOTA_DB_PATH", "ims_quota.sqlite3")  # shared with the admin scripts
+
+@st.cache_resource
+def get_quota_bucket():
+    return shared_bucket(QUOTA_DB_PATH, capacity=QUOTA_PER_MINUTE)
+
 class APIQuotaManager:
-    def __init__(self, max_calls_per_minute=40):
-        self.max_calls = max_calls_per_minute
-        st.session_state.setdefault('api_calls', [])
-    def can_make_call(self):
-        now = datetime.now()
-        st.session_state.api_calls = [t for t in st.session_state.api_calls if (now - t).seconds < 60]
-        return len(st.session_state.api_calls) < self.max_calls
-    def record_call(self): st.session_state.api_calls.append(datetime.now())
-    def wait_time(self):
-        if not st.session_state.api_calls: return 0
-        oldest = min(st.session_state.api_calls); return max(0, 60 - (datetime.now() - oldest).seconds)
-
-quota_manager = APIQuotaManager()
-
-def api_rate_limit():
-    if not quota_manager.can_make_call():
-        wt = quota_manager.wait_time(); st.info(f"⏱️ Waiting {wt}s (quota)…"); time.sleep(wt)
-    quota_manager.record_call()
-    last = st.session_state.get('last_api_call', 0); now = time.time()
-    if now - last < 0.8: time.sleep(0.8 - (now - last))
-    st.session_state['last_api_call'] = time.time()
+    """View over the project-wide token bucket (all sessions, threads and admin scripts).
+
+    Tokens are taken by the backend when a request is actually sent, so callers only check/wait here.
+    """
+    def __init__(self, bucket):
+        self.bucket, self.max_calls = bucket, bucket.capacity
+    def can_make_call(self): return self.bucket.wait_time() <= 0
+    def wait_time(self): return int(math.ceil(self.bucket.wait_time()))
+    def usage(self): return self.bucket.usage()
+
+quota_manager = APIQuotaManager(get_quota_bucket())
+
+# =========================
+# Non-blocking Google calls
+# =========================
+# Quota waits and 429 backoff happen on the scheduler's worker threads; the page
+# shows a pending state and a polling fragment reruns it once results are in.
+API_WORKERS = int(st.secrets.get("IMS_API_WORKERS", 4))
+API_BACKGROUND_WORKERS = int(st.secrets.get("IMS_API_BACKGROUND_WORKERS", 1))  # mirror sync batches
+
+@st.cache_resource
+def get_api_scheduler():
+    return ApiScheduler(get_quota_bucket(), max_workers=API_WORKERS, background_workers=API_BACKGROUND_WORKERS)
+
+api_scheduler = get_api_scheduler()
+
+FETCH_BATCH = int(st.secrets.get("IMS_FETCH_BATCH", 10))  # worksheets per values_batch_get
+
+@st.cache_resource
+def get_fetch_engine():
+    return FetchEngine(get_api_scheduler(), batch=FETCH_BATCH)
+_run_pending = []  # futures this run is waiting on (reset on every rerun)
+
+def track_pending(label, fut, ok_msg, reset=None):
+    """Keep a background write across reruns; report it via toast once it completes.
+
+    `reset` names a pinned snapshot (see pinned_snapshot) to re-pin once the write has succeeded.
+    """
+    st.session_state.setdefault("pending_ops", []).append({"label": label, "future": fut, "ok": ok_msg, "reset": reset})
+
+def collect(key, fut, pending_msg, error_msg):
+    """Result of a keyed read if it has finished; otherwise show a pending/error note and return None."""
+    if not fut.done():
+        _run_pending.append(fut)
+        wt = quota_manager.wait_time()
+        st.info(f"⏳ {pending_msg}" + (f" (quota: ~{wt}s)" if wt else "")); return None
+    if fut.exception() is not None:
+        api_scheduler.forget(key)  # retry on the next rerun
+        st.error(f"{error_msg}: {fut.exception()}"); return None
+    return fut.result()
 
 # =========================
 # Google Sheets helpers
@@ -213,103 +253,307 @@ def api_rate_limit():
 @st.cache_resource
 @with_backoff()
 def get_gsheet_client(sheet_id):
-    creds = ServiceAccountCredentials.from_json_keyfile_name(CREDENTIAL_FILE, SCOPE)
-    return gspread.authorize(creds).open_by_key(sheet_id)
+    get_quota_bucket().acquire()
+    return google_client(CREDENTIAL_FILE).open_by_key(sheet_id)
+
+@st.cache_resource
+def get_backend(sheet_id):
+    if BACKEND_KIND == "local": return LocalBackend(sheet_id, LOCAL_DB_PATH)
+    return GoogleSheetsBackend(get_gsheet_client(sheet_id), quota=get_quota_bucket())
 
 @st.cache_data(ttl=900, show_spinner=False)
 @with_backoff()
 def list_worksheets(sheet_id):  # fewer calls, longer cache
-    return [ws.title for ws in get_gsheet_client(sheet_id).worksheets()]
+    return get_backend(sheet_id).list_worksheets()
 
 def get_all_sheet_names(sheet_id):
     try: return list_worksheets(sheet_id)
     except Exception as e: st.error(f"Error fetching sheet names: {e}"); return []
 
-@st.cache_data(ttl=900, show_spinner=False)  # longer cache to reduce API reads
-@with_backoff()
-def fetch_sheet_all_values(sheet_name, sheet_id):
-    return get_gsheet_client(sheet_id).worksheet(sheet_name).get_all_values()
+def fetch_sheet_all_values(sheet_name, sheet_id):  # cached by the mirror, not st.cache_data
+    return get_backend(sheet_id).get_values(sheet_name)
 
-def get_sheet_data(sheet_name, sheet_id):
-    if not quota_manager.can_make_call():
-        st.info(f"⏱️ Please wait {quota_manager.wait_time()}s…"); return [], []
-    try:
-        quota_manager.record_call()
-        all_values = fetch_sheet_all_values(sheet_name, sheet_id)
-        if not all_values: return [], []
-        headers = all_values[0]
-        # build dict rows without extra processing
-        if len(all_values) > 1:
-            width = len(headers)
-            records = [dict(zip(headers, row + [""]*(width-len(row)))) for row in all_values[1:]]
-        else:
-            records = []
-        return headers, records
-    except Exception as e:
-        st.error(f"Error fetching data from '{sheet_name}': {e}")
-        return [], []
+def load_sheet_into_mirror(sheet_name, sheet_id):
+    mirror.replace(sheet_id, sheet_name, fetch_sheet_all_values(sheet_name, sheet_id))
+
+def fetch_headers_batch(sheet_id, sheet_names):
+    """Row 1 of every worksheet in one values_batch_get call -> {name: headers}."""
+    names = list(sheet_names)
+    if not names: return {}
+    grids = get_backend(sheet_id).batch_get([(n, "1:1") for n in names])
+    return {n: ((g or [[]])[0]) for n, g in zip(names, grids)}
+
+# =========================
+# Local mirror (SQLite, read-through)
+# =========================
+MIRROR_PATH = st.secrets.get("IMS_MIRROR_PATH", "ims_mirror.sqlite3")
+MIRROR_SYNC_SECONDS = int(st.secrets.get("IMS_MIRROR_SYNC_SECONDS", 120))  # cheap: unchanged files are only probed
+
+@retrying
+def fetch_spreadsheet_values(sheet_id):
+    backend = get_backend(sheet_id)
+    with get_quota_bucket().priority(BACKGROUND):  # never starve interactive reads/writes
+        names = backend.list_worksheets()
+    return get_fetch_engine().fetch_all(backend, names, priority=BACKGROUND)
+
+@retrying
+def probe_spreadsheet_revision(sheet_id):
+    return get_backend(sheet_id).revision()
+
+@st.cache_resource
+def get_mirror():
+    mirror = SheetMirror(MIRROR_PATH)
+    sync = MirrorSync(mirror, SHEET_IDS.values(), fetch_spreadsheet_values, interval=MIRROR_SYNC_SECONDS,
+                      probe=probe_spreadsheet_revision)
+    return mirror, sync.start()
+
+mirror, mirror_sync = get_mirror()
+
+def ensure_mirrored(sheet_name, sheet_id):
+    """Schedule the first load of a worksheet into the mirror, showing its pending/error state."""
+    if mirror.has(sheet_id, sheet_name): return
+    key = ("values", sheet_id, sheet_name)
+    fut = api_scheduler.submit(key, load_sheet_into_mirror, sheet_name, sheet_id)
+    if not fut.done() or fut.exception() is not None:
+        collect(key, fut, f"Loading '{sheet_name}' from Google…", f"Error fetching data from '{sheet_name}'")
+
+@st.cache_resource
+def get_frame_cache():
+    return TTLCache(maxsize=32, ttl=3600)
+
+def get_sheet_frame(sheet_name, sheet_id, cfg=None, typed=False):
+    """(headers, DataFrame) built column-wise from the mirror, cached per sheet version and shared
+    by all sessions — callers must not mutate the frame. typed=True parses date/number columns."""
+    return get_versioned_frame(sheet_name, sheet_id, cfg, typed)[1:]
+
+def get_versioned_frame(sheet_name, sheet_id, cfg=None, typed=False):
+    """(mirror version, headers, DataFrame): the version the frame was read at, for caches derived from it."""
+    version = mirror.version(sheet_id, sheet_name)
+    if version is None:
+        ensure_mirrored(sheet_name, sheet_id)
+        version = mirror.version(sheet_id, sheet_name)
+        if version is None: return None, [], pd.DataFrame()
+    hit = get_frame_cache().get((sheet_id, sheet_name, version, typed, cfg.digest if cfg else None))
+    if hit is None:
+        version, values = mirror.read_versioned(sheet_id, sheet_name)  # may be newer than the probe above
+        if version is None: return None, [], pd.DataFrame()
+        hit = (list(values[0]) if values else [], frame_from_grid(values or [], cfg, typed=typed))
+        get_frame_cache().put((sheet_id, sheet_name, version, typed, cfg.digest if cfg else None), hit)
+    return (version, *hit)
+
+def get_search_index(sheet_name, sheet_id, version):
+    """SearchIndex over the raw cell strings of `version` (as returned by get_versioned_frame),
+    built once per version; None if the mirror has already moved past it."""
+    key = (sheet_id, sheet_name, version, "search")
+    hit = get_frame_cache().get(key)
+    if hit is None:
+        current, _, raw = get_versioned_frame(sheet_name, sheet_id)
+        if current != version: return None
+        hit = SearchIndex(raw); get_frame_cache().put(key, hit)
+    return hit
+
+# =========================
+# Windowed reads (Data View pagination)
+# =========================
+# Mirrored sheets page straight out of SQLite; others read only the A1 window
+# for the page (plus its neighbours, in the same batch_get) and count rows with backend.last_row.
+PAGE_SIZES = [50, 100, 250, 500]
+
+@st.cache_resource
+def get_page_cache():
+    return TTLCache(maxsize=128, ttl=MIRROR_SYNC_SECONDS)
+
+page_cache = get_page_cache()
+
+def forget_pages(sheet_id, sheet_name):
+    """Drop cached row counts, headers and pages of one worksheet (after a write to it)."""
+    page_cache.discard_where(lambda k: k[1:3] == (sheet_id, sheet_name))
+
+def page_bounds(total, page_size, page):
+    """Sheet row range for `page` counted from the newest rows (page 1 = latest)."""
+    end = total + 1 - (page - 1) * page_size
+    return max(2, end - page_size + 1), end
+
+def count_sheet_rows(sheet_name, sheet_id):
+    n = max(get_backend(sheet_id).last_row(sheet_name) - 1, 0)
+    page_cache.put(("count", sheet_id, sheet_name), n)
+    return n
+
+def fetch_sheet_windows(sheet_name, sheet_id, windows):
+    """Header row + every (start, end) window in one batch_get; all windows go into the page cache."""
+    grids = get_backend(sheet_id).batch_get([(sheet_name, "1:1")] + [(sheet_name, f"{a}:{b}") for a, b in windows])
+    headers = (grids[0] or [[]])[0]
+    page_cache.put(("headers", sheet_id, sheet_name), headers)
+    for (a, b), rows in zip(windows, grids[1:]):
+        page_cache.put(("page", sheet_id, sheet_name, a, b), (headers, rows + [[]] * (b - a + 1 - len(rows))))
+    return page_cache.get(("page", sheet_id, sheet_name, *windows[0]))
+
+def fetch_sheet_headers(sheet_name, sheet_id):
+    headers = fetch_headers_batch(sheet_id, [sheet_name])[sheet_name]
+    page_cache.put(("headers", sheet_id, sheet_name), headers)
+    return headers
+
+def get_sheet_headers(sheet_name, sheet_id):
+    """Header row from the mirror or the page cache (one 1:1 read otherwise); None while pending."""
+    if mirror.has(sheet_id, sheet_name): return mirror.headers(sheet_id, sheet_name)
+    hit = page_cache.get(("headers", sheet_id, sheet_name))
+    if hit is not None: return hit
+    key = ("headers", sheet_id, sheet_name)
+    return collect(key, api_scheduler.submit(key, fetch_sheet_headers, sheet_name, sheet_id),
+                   f"Loading headers of '{sheet_name}'…", f"Error fetching headers of '{sheet_name}'")
+
+def get_sheet_row_count(sheet_name, sheet_id):
+    """Data rows excluding the header; None while a remote count is pending."""
+    if mirror.has(sheet_id, sheet_name): return mirror.row_count(sheet_id, sheet_name) - 1
+    hit = page_cache.get(("count", sheet_id, sheet_name))
+    if hit is not None: return hit
+    key = ("count", sheet_id, sheet_name)
+    return collect(key, api_scheduler.submit(key, count_sheet_rows, sheet_name, sheet_id),
+                   f"Counting rows in '{sheet_name}'…", f"Error counting rows in '{sheet_name}'")
+
+def get_sheet_page(sheet_name, sheet_id, total, page_size, page):
+    """DataFrame for one page, indexed by sheet row number; None while pending."""
+    start, end = page_bounds(total, page_size, page)
+    if mirror.has(sheet_id, sheet_name):
+        headers, rows = mirror.headers(sheet_id, sheet_name), mirror.read_rows(sheet_id, sheet_name, start, end)
+    else:
+        hit = page_cache.get(("page", sheet_id, sheet_name, start, end))
+        if hit is None:
+            n_pages = max(1, math.ceil(total / page_size))
+            neighbours = [page_bounds(total, page_size, p) for p in (page - 1, page + 1) if 1 <= p <= n_pages]
+            windows = [(start, end)] + [w for w in neighbours if page_cache.get(("page", sheet_id, sheet_name, *w)) is None]
+            key = ("page", sheet_id, sheet_name, start, end)
+            hit = collect(key, api_scheduler.submit(key, fetch_sheet_windows, sheet_name, sheet_id, windows),
+                          f"Loading rows {start}–{end} of '{sheet_name}'…", f"Error fetching '{sheet_name}'")
+            if hit is None: return None
+        headers, rows = hit
+    width = len(headers)
+    return pd.DataFrame([(r + [""] * (width - len(r)))[:width] for r in rows], columns=headers,
+                        index=pd.RangeIndex(start, end + 1, name="Row"))
+
+# =========================
+# Buffered appends (one append_rows per worksheet per flush)
+# =========================
+WRITE_FLUSH_SECONDS = float(st.secrets.get("IMS_WRITE_FLUSH_SECONDS", 0.5))
+WRITE_MAX_BATCH = int(st.secrets.get("IMS_WRITE_MAX_BATCH", 50))
+
+@st.cache_resource
+def get_write_queue(sheet_id):
+    backend = get_backend(sheet_id)
+    def patch_mirror(sheet_name, start_row, rows):
+        mirror.put_rows(sheet_id, sheet_name, start_row, rows)
+        forget_pages(sheet_id, sheet_name)
+    return WriteQueue(retrying(backend.append_rows), flush_interval=WRITE_FLUSH_SECONDS,
+                      max_batch=WRITE_MAX_BATCH, on_commit=patch_mirror)
+
+def create_new_worksheet(name, headers, sheet_id, progress):
+    """Resumable under `retrying`: once progress["created"] is set, a retry only rewrites the header row."""
+    backend = get_backend(sheet_id)
+    if not progress.get("created"):
+        backend.add_worksheet(name, [], cols=len(headers))
+        progress["created"] = True
+        list_worksheets.clear()
+    if headers: backend.update_range(name, "A1", [list(headers)])
+
+def delete_worksheet(name, sheet_id):
+    get_backend(sheet_id).delete_worksheet(name)
+    mirror.forget(sheet_id, name); list_worksheets.clear()
+
+def update_sheet_row(sheet_name, sheet_id, row_num, row):
+    end = rowcol_to_a1(row_num, max(len(row), 1))
+    get_backend(sheet_id).update_range(sheet_name, f"A{row_num}:{end}", [row])
+    mirror.put_rows(sheet_id, sheet_name, row_num, [row])
+    forget_pages(sheet_id, sheet_name)
+    return row_num
+
+def update_sheet_cells(sheet_name, sheet_id, cells):
+    """Write only the changed cells [(row, col, value)] in one batch_update request."""
+    get_backend(sheet_id).batch_update(sheet_name, cell_ranges(cells))
+    mirror.update_cells(sheet_id, sheet_name, cells)
+    forget_pages(sheet_id, sheet_name)
+    return len(cells)
+
+# =========================
+# Bulk import
+# =========================
+IMPORT_CHUNK = int(st.secrets.get("IMS_IMPORT_CHUNK", 500))
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def read_upload(data, filename):
+    """Every cell as a string; .xlsx needs openpyxl."""
+    if filename.lower().endswith(".xlsx"):
+        return pd.read_excel(BytesIO(data), dtype=str, keep_default_na=False)
+    return pd.read_csv(BytesIO(data), dtype=str, keep_default_na=False, encoding="utf-8-sig")
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def prepare_upload(data, filename, cfg_digest, headers, _cfg):
+    """prepare_import of an upload, memoised on (file bytes, config digest, headers) across reruns."""
+    return prepare_import(read_upload(data, filename), _cfg, headers)
+
+def append_rows_chunked(sheet_name, sheet_id, rows, progress, chunk=IMPORT_CHUNK):
+    """One append_rows per `chunk` rows. Resumes from progress["written"], so a retry never re-sends a chunk."""
+    backend = get_backend(sheet_id)
+    while progress["written"] < len(rows):
+        part = rows[progress["written"]:progress["written"] + chunk]
+        start = backend.append_rows(sheet_name, part)
+        mirror.put_rows(sheet_id, sheet_name, start, part)
+        progress["written"] += len(part)
+    forget_pages(sheet_id, sheet_name)
+    return progress["written"]
+
+@st.cache_resource
+def get_config_registry():
+    return ConfigRegistry()
 
-@st.cache_data(ttl=3600, show_spinner=False)
 def load_form_configs_for_sheet(sheet_type):
+    """Parsed once per file change (mtime), shared by every session."""
+    registry = get_config_registry()
     try:
-        cfg_file = "form_configs.json" if sheet_type == "LW FILES" else "forms_mpr_configs.json"
-        with open(cfg_file, "r", encoding="utf-8") as f: return json.load(f)
+        configs = registry.get(sheet_type)
     except FileNotFoundError:
         st.error(f"Config file not found for {sheet_type}"); return {}
     except json.JSONDecodeError as e:
         st.error(f"Error parsing config: {e}"); return {}
+    if sheet_type in registry.errors:
+        st.error(f"Error parsing config (still using the last good version): {registry.errors[sheet_type]}")
+    return configs
 
 # =========================
-# Header Normalization
+# PDF worker processes
 # =========================
-def _to_ascii_equiv(s: str) -> str:
-    repl = {'\u2018':"'", '\u2019':"'", '\u201C':'"', '\u201D':'"', '\u2013':'-', '\u2014':'-', '\u00A0':' '}
-    return ''.join(repl.get(ch, ch) for ch in s)
-
-def normalize_header(h: str) -> str:
-    if not isinstance(h, str): return ""
-    s = _to_ascii_equiv(h.strip())
-    s = unicodedata.normalize('NFKC', s)
-    s = re.sub(r'\s+', ' ', s)
-    return s.lower()
-
-def expected_headers_from_config(cfg: dict):
-    return list(cfg.get("fields", [])) + list(cfg.get("signatures", []))
-
-def build_header_mapping(actual_headers, expected_headers):
-    norm_to_actual, problems = {}, []
-    for a in actual_headers:
-        na = normalize_header(a)
-        if na in norm_to_actual and norm_to_actual[na] != a:
-            problems.append(f"Collision after normalization: '{norm_to_actual[na]}' vs '{a}'")
-        norm_to_actual[na] = a
-    norm_expected = [normalize_header(e) for e in expected_headers]
-    only_after_norm = []
-    for e_raw, e_norm in zip(expected_headers, norm_expected):
-        if e_norm in norm_to_actual and e_raw != norm_to_actual[e_norm]:
-            only_after_norm.append((e_raw, norm_to_actual[e_norm]))
-    if only_after_norm:
-        problems.append("Matched after normalization: " + ", ".join([f"'{a}' ↔ '{b}'" for a,b in only_after_norm]))
-    return norm_to_actual, norm_expected, problems
-
-def diff_config_vs_sheet(config, headers):
-    expected = expected_headers_from_config(config)
-    headers = headers or []
-    norm_to_actual, norm_expected, problems = build_header_mapping(headers, expected)
-    norm_actual_order = [normalize_header(h) for h in headers]
-    missing_norm = [ne for ne in norm_expected if ne not in norm_to_actual]
-    extra_norm   = [na for na in norm_actual_order if na not in norm_expected]
-    missing_display = [expected[norm_expected.index(ne)] for ne in missing_norm]
-    extra_display = [next((h for h in headers if normalize_header(h) == na), na) for na in extra_norm]
-    order_match = (norm_actual_order == norm_expected)
-    return {
-        "missing_in_sheet": missing_display,
-        "extra_in_sheet": extra_display,
-        "order_match": order_match,
-        "expected": expected,
-        "actual": headers,
-        "notes": problems,
-    }
+PDF_WORKERS = int(st.secrets.get("IMS_PDF_WORKERS", 0)) or None  # None -> one per CPU
+TABLE_CHUNK_ROWS = int(st.secrets.get("IMS_TABLE_CHUNK_ROWS", 250))
+
+@st.cache_resource
+def get_pdf_pool():
+    return pdf_pool(PDF_WORKERS)
+
+PDF_CACHE_DIR = st.secrets.get("IMS_PDF_CACHE_DIR", "pdf_cache")
+PDF_CACHE_MB = int(st.secrets.get("IMS_PDF_CACHE_MB", 64))
+PDF_CACHE_DISK_MB = int(st.secrets.get("IMS_PDF_CACHE_DISK_MB", 512))
+
+@st.cache_resource
+def get_pdf_cache():
+    return PdfCache(PDF_CACHE_MB << 20, PDF_CACHE_DIR or None, PDF_CACHE_DISK_MB << 20)
+
+PDF_ARCHIVE_DIR = st.secrets.get("IMS_PDF_ARCHIVE_DIR", "pdf_archive")  # written by ims_nightly.py
+JOBS_DB = st.secrets.get("IMS_JOBS_DB", "ims_jobs.sqlite3")
+JOBS_DIR = st.secrets.get("IMS_JOBS_DIR", "pdf_jobs")
+JOBS_TTL_HOURS = float(st.secrets.get("IMS_JOBS_TTL_HOURS", 24))
+JOB_WORKER = st.secrets.get("IMS_JOB_WORKER", "embedded")  # "external": run `python ims_jobs.py` separately
+
+@st.cache_resource
+def get_job_store():
+    if JOB_WORKER == "embedded":
+        start_worker(JOBS_DB, JOBS_DIR, JOBS_TTL_HOURS * 3600, PDF_CACHE_DIR or None, PDF_WORKERS)
+    return JobStore(JOBS_DB, JOBS_DIR, JOBS_TTL_HOURS * 3600)
+
+def submit_pdf_job(kind, params, label):
+    job_id = get_job_store().submit(kind, params, label, owner=st.session_state.get("current_user"))
+    st.success(f"🗂 Export queued as job {job_id} — it is listed under Recent export jobs below.")
+
+def cached_note(ts, hit):
+    return f" (cached copy generated {datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M')})" if hit else ""
 
 # =========================
 # DATA (load once per selection)
@@ -329,7 +573,71 @@ render_mgmt = st.session_state.active_section == "⚙️ Sheet Management"
 # -------------------------
 # FORM ENTRY
 # -------------------------
+# Grid edits and bulk sign-offs are made against a snapshot of the sheet pinned
+# in session_state with its mirror version, so a background sync mid-edit does
+# not reset the editor; the version is checked again when changes are applied.
+def pinned_snapshot(key, frame, sheet):
+    """(version, frame indexed by sheet row) taken the first time `key` is seen."""
+    if key + "_base" not in st.session_state:
+        base = frame.astype(object)  # categoricals would restrict input to existing values
+        base.index += 2
+        st.session_state[key + "_base"] = (mirror.version(GOOGLE_SHEET_ID, sheet), base)
+    return st.session_state[key + "_base"]
+
+def reset_snapshot(key):
+    stay_on("📝 Form Entry")
+    st.session_state.pop(key, None); st.session_state.pop(key + "_base", None)
+
+def settle_snapshots():
+    """Re-pin snapshots whose write has finished; a failed write keeps the user's edits for a retry."""
+    for op in st.session_state.get("pending_ops", []):
+        if op.get("reset") and op["future"].done():
+            if op["future"].exception() is None:
+                st.session_state.pop(op["reset"], None); st.session_state.pop(op["reset"] + "_base", None)
+            op["reset"] = None
+
+def snapshot_saving(key):
+    return any(op.get("reset") == key for op in st.session_state.get("pending_ops", []))
+
+def save_grid_cells(key, sheet, cells, seen_version):
+    if mirror.version(GOOGLE_SHEET_ID, sheet) != seen_version:  # synced between render and click
+        stay_on("📝 Form Entry")
+        st.session_state["grid_note"] = "The sheet changed again just now — review the changes below and save again."
+        return
+    stay_on("📝 Form Entry")
+    fut = api_scheduler.submit(None, update_sheet_cells, sheet, GOOGLE_SHEET_ID, cells)
+    track_pending(f"Grid edit of {sheet}", fut, "✅ {result} cell(s) updated.", reset=key)
+
+def sign_rows(key, sheet, cfg, signer, sig_col, rows):
+    """Sign `rows`, skipping any whose contents changed since they were listed."""
+    version, base = st.session_state[key + "_base"]
+    skipped = []
+    if mirror.version(GOOGLE_SHEET_ID, sheet) != version:
+        _, frame = get_sheet_frame(sheet, GOOGLE_SHEET_ID, cfg)
+        current = frame.astype(object); current.index += 2
+        skipped = stale_rows(base.iloc[:, 1:], current, rows)
+    cells = [(int(r), sig_col, SIGNED) for r in rows if r not in set(skipped)]
+    if skipped:
+        st.session_state["bulk_sig_note"] = (f"Skipped {len(skipped)} row(s) that changed since they were listed: "
+                                             + ", ".join(map(str, skipped)))
+    if cells:
+        stay_on("📝 Form Entry")
+        fut = api_scheduler.submit(None, update_sheet_cells, sheet, GOOGLE_SHEET_ID, cells)
+        track_pending(f"{signer} sign-off", fut, "✅ {result} row(s) signed.", reset=key)
+    else:
+        reset_snapshot(key)
+
+def start_import(key, sheet, rows, progress):
+    """Append an upload once: keyed on its hash, and a failed attempt resumes from progress["written"]."""
+    stay_on("📝 Form Entry")
+    running = api_scheduler.peek(key)
+    if running is not None and not running.done(): return
+    api_scheduler.forget(key)  # drop a failed attempt so it can be retried
+    fut = api_scheduler.submit(key, append_rows_chunked, sheet, GOOGLE_SHEET_ID, rows, progress)
+    track_pending(f"Import into {sheet}", fut, "✅ Imported {result} row(s).")
+
 if render_form:
+    settle_snapshots()
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.markdown('<div class="section-title">✏️ Form Entry & Edit</div>', unsafe_allow_html=True)
 
@@ -340,8 +648,7 @@ if render_form:
     )
 
     form_cfg = form_configs[selected_form]
-    headers, records = get_sheet_data(selected_form, GOOGLE_SHEET_ID)
-    df = pd.DataFrame(records) if records else pd.DataFrame()
+    form_version, headers, df = get_versioned_frame(selected_form, GOOGLE_SHEET_ID, form_cfg)
 
     # On-demand sheet match check (no auto spam)
     if st.button("✅ Check Sheet Match", key="check_match_form", on_click=stay_on, args=("📝 Form Entry",)):
@@ -358,6 +665,78 @@ if render_form:
             st.success("Perfect match ✅")
 
     st.markdown(f"**{form_cfg['title']}**")
+    grid_mode = st.checkbox("Enable Grid Edit (many rows)")
+    grid_key = f"grid_{GOOGLE_SHEET_ID}_{selected_form}"
+    if grid_mode and not df.empty:
+        st.info("Edit cells directly; only the changed cells are sent when you save.")
+        if "grid_note" in st.session_state: st.warning(st.session_state.pop("grid_note"))
+        base_version, grid_base = pinned_snapshot(grid_key, df, selected_form)
+        edited = st.data_editor(grid_base, use_container_width=True, num_rows="fixed", key=grid_key)
+        changes = cell_diff(grid_base, edited)
+        st.caption(f"{len(changes)} changed cell(s) in {len({r for r, _, _ in changes})} row(s)")
+        conflicts, seen_version = [], mirror.version(GOOGLE_SHEET_ID, selected_form)
+        if seen_version != base_version:
+            current = df.astype(object); current.index += 2
+            conflicts = stale_cells(grid_base, current, changes)
+            if conflicts:
+                st.error(f"{len(conflicts)} of your edited cell(s) were changed in the sheet since you started editing.")
+                st.dataframe(pd.DataFrame(
+                    [(r, grid_base.columns[c - 1], v, current.iat[current.index.get_loc(r), c - 1] if r in current.index else "(row gone)")
+                     for r, c, v in conflicts], columns=["Row", "Column", "Yours", "In sheet now"]), hide_index=True)
+            else:
+                st.warning("The sheet changed since you started editing; none of your cells were touched, "
+                           "so saving writes only your changes on top.")
+        g1, g2 = st.columns(2)
+        saving = snapshot_saving(grid_key)
+        if saving:
+            g1.caption("⏳ Saving your changes…")
+        elif changes:
+            g1.button("💾 Overwrite with my changes" if conflicts else "💾 Save cell changes", key="grid_save",
+                      type="primary", on_click=save_grid_cells, args=(grid_key, selected_form, changes, seen_version))
+        g2.button("↩️ Discard edits and reload", key="grid_reset", disabled=saving,
+                  on_click=reset_snapshot, args=(grid_key,))
+    else:
+        st.session_state.pop(grid_key + "_base", None)
+    if form_cfg.get("signatures") and not df.empty:
+        with st.expander("✍️ Bulk Sign-off", expanded=False):
+            if "bulk_sig_note" in st.session_state: st.warning(st.session_state.pop("bulk_sig_note"))
+            signer = st.selectbox("Signature column", form_cfg["signatures"], key=f"bulk_sig_{selected_form}")
+            sig_col = bind_schema(headers, form_cfg).column_of(signer)
+            if sig_col is None:
+                st.warning(f"'{signer}' is not a column in this sheet.")
+            else:
+                sq = st.text_input("🔍 Narrow down…", key=f"bulk_sig_q_{selected_form}")
+                sig_key = f"bulk_sig_grid_{selected_form}_{signer}_{sq}"
+                if sig_key + "_base" not in st.session_state:
+                    unsigned = condition_mask(df.iloc[:, sig_col - 1], "signature", "not signed")
+                    if sq:
+                        index = get_search_index(selected_form, GOOGLE_SHEET_ID, form_version)
+                        if index is None: st.rerun()  # synced since df was read
+                        hits = np.zeros(len(df), dtype=bool); hits[index.search(sq)] = True
+                        unsigned &= hits
+                    listed = df[unsigned].astype(object)
+                    listed.insert(0, "✅ Sign", False, allow_duplicates=True)
+                    pinned_snapshot(sig_key, listed, selected_form)
+                listed_version, to_sign = st.session_state[sig_key + "_base"]
+                st.caption(f"{len(to_sign)} row(s) not yet signed by {signer}")
+                if mirror.version(GOOGLE_SHEET_ID, selected_form) != listed_version:
+                    st.caption("The sheet has changed since this list was built; rows changed since then are "
+                               "skipped when signing. ↩️ Refresh the list to see the latest.")
+                if snapshot_saving(sig_key):
+                    st.info("⏳ Signing… the list is rebuilt once the sign-off is saved.")
+                elif len(to_sign):
+                    picked = st.data_editor(to_sign, use_container_width=True, height=320, num_rows="fixed",
+                                            disabled=list(to_sign.columns[1:]), key=sig_key)
+                    ticked = list(picked.index[picked.iloc[:, 0].astype(bool).to_numpy()])
+                    b1, b2, b3 = st.columns(3)
+                    b1.button(f"✍️ Sign {len(ticked)} ticked", key="bulk_sign_ticked", disabled=not ticked,
+                              on_click=sign_rows, args=(sig_key, selected_form, form_cfg, signer, sig_col, ticked))
+                    b2.button(f"✍️ Sign all {len(to_sign)} listed", key="bulk_sign_all",
+                              on_click=sign_rows, args=(sig_key, selected_form, form_cfg, signer, sig_col, list(to_sign.index)))
+                    b3.button("↩️ Refresh list", key="bulk_sign_reset", on_click=reset_snapshot, args=(sig_key,))
+                else:
+                    st.button("↩️ Refresh list", key="bulk_sign_reset", on_click=reset_snapshot, args=(sig_key,))
+
     edit_mode = st.checkbox("Enable Edit Mode")
     selected_row_index, prefill_data = None, {}
 
@@ -374,7 +753,7 @@ if render_form:
     # Build form controls
     form_values, signature_values = {}, {}
     with st.form("entry_form"):
-        fields, sigs = form_cfg.get("fields", []), form_cfg.get("signatures", [])
+        fields, sigs = form_cfg.fields, form_cfg.signatures
         cols_per_row = 2
         for i in range(0, len(fields), cols_per_row):
             cols = st.columns(cols_per_row)
@@ -384,7 +763,7 @@ if render_form:
                     field = fields[idx]
                     curr = prefill_data.get(field, "")
                     with cols[j]:
-                        if (len(str(curr)) > 100 or any(k in field.lower() for k in ['description','details','notes','remarks','comment','address','specification','procedure'])):
+                        if form_cfg.widgets[idx] == "textarea" or len(str(curr)) > 100:
                             form_values[field] = st.text_area(field, value=str(curr), height=120)
                         else:
                             form_values[field] = st.text_input(field, value=str(curr))
@@ -399,43 +778,129 @@ if render_form:
 
         submitted = st.form_submit_button("💾 Submit Entry", use_container_width=True, type="primary")
 
-    if submitted:
+    if submitted and not headers:
+        st.warning("Sheet is still loading — please submit again in a moment.")
+    elif submitted:
         try:
-            api_rate_limit()
             # Build payload (fields + signatures)
             payload = {}
-            for f in form_cfg.get("fields", []): payload[f] = form_values.get(f, "")
-            for s in form_cfg.get("signatures", []): payload[s] = "✔️ Yes" if signature_values.get(s, False) else "❌ No"
-
-            # Map by normalized names to actual headers
-            expected = expected_headers_from_config(form_cfg)
-            nmap, n_expected, _ = build_header_mapping(headers, expected)
-            payload_norm = {normalize_header(k): v for k,v in payload.items()}
+            for f in form_cfg.fields: payload[f] = form_values.get(f, "")
+            for s in form_cfg.signatures: payload[s] = SIGNED if signature_values.get(s, False) else "❌ No"
 
-            row = []
-            for h in headers:
-                nh = normalize_header(h)
-                val = payload_norm.get(nh, "")
-                row.append("" if val is None else str(val))
+            # Map by normalized names to actual headers (binding is cached per header row)
+            row = bind_schema(headers, form_cfg).row_from(payload)
 
-            ws = get_gsheet_client(GOOGLE_SHEET_ID).worksheet(selected_form)
+            # both paths patch the mirror on commit -> nothing to refetch
             if edit_mode and selected_row_index is not None:
-                start = rowcol_to_a1(selected_row_index + 2, 1)
-                end = rowcol_to_a1(selected_row_index + 2, len(headers))
-                ws.update(f"{start}:{end}", [row])
-                st.success(f"✅ Row {selected_row_index + 2} updated.")
+                fut = api_scheduler.submit(None, update_sheet_row, selected_form, GOOGLE_SHEET_ID, selected_row_index + 2, row)
+                track_pending(f"Update of row {selected_row_index + 2}", fut, "✅ Row {result} updated.")
             else:
-                ws.append_row(row)
-                st.success("✅ New entry submitted.")
-            st.cache_data.clear(); st.rerun()
+                # queued: concurrent submits to the same form share one append_rows call
+                fut = get_write_queue(GOOGLE_SHEET_ID).submit(selected_form, row)
+                track_pending(f"Entry for {selected_form}", fut, "✅ New entry submitted (row {result}).")
+            st.info("⏳ Saving…")
         except Exception as e:
             st.error(f"❌ Error writing to Google Sheet: {e}")
 
+    with st.expander("📥 Bulk Import (CSV / Excel)", expanded=False):
+        upload = st.file_uploader("Upload rows for this form", type=["csv", "xlsx"], key=f"import_{selected_form}")
+        raw = None
+        if upload is not None:
+            try:
+                raw = read_upload(upload.getvalue(), upload.name)  # cached; surfaces read errors here
+            except ImportError:
+                st.error("Reading .xlsx files needs openpyxl (pip install openpyxl).")
+            except Exception as e:
+                st.error(f"Could not read {upload.name}: {e}")
+        if raw is not None and not headers:
+            st.warning("Sheet is still loading — the import preview appears once its headers are known.")
+        elif raw is not None:
+            rows, rejects, notes = prepare_upload(upload.getvalue(), upload.name, form_cfg.digest, headers, form_cfg)
+            for note in notes: st.caption(note)
+            st.write(f"**{len(rows)}** row(s) ready • **{len(rejects)}** rejected • "
+                     f"~{math.ceil(len(rows) / IMPORT_CHUNK)} append call(s)")
+            if len(rejects):
+                st.dataframe(rejects, use_container_width=True, height=240)
+            import_key = f"import_{GOOGLE_SHEET_ID}_{selected_form}_{hashlib.sha1(upload.getvalue()).hexdigest()}"
+            progress = st.session_state.setdefault(import_key, {"written": 0})
+            running = api_scheduler.peek(import_key)
+            if running is not None and not running.done():
+                st.info(f"⏳ Importing… {progress['written']} of {len(rows)} row(s) written.")
+            elif rows and progress["written"] >= len(rows):
+                st.success(f"✅ This file has been imported ({len(rows)} row(s)).")
+            elif rows:
+                label = (f"📥 Resume import at row {progress['written'] + 1} of {len(rows)}" if progress["written"]
+                         else f"📥 Import {len(rows)} row(s)")
+                st.button(label, key=f"do_import_{selected_form}", on_click=start_import,
+                          args=(import_key, selected_form, rows, progress))
+
     st.markdown('</div>', unsafe_allow_html=True)
 
 # -------------------------
 # DATA VIEW
 # -------------------------
+def _filter_count_key(sheet):
+    return f"view_filters_{sheet}"
+
+def add_filter(sheet):
+    stay_on("📊 Data View")
+    st.session_state[_filter_count_key(sheet)] = st.session_state.get(_filter_count_key(sheet), 0) + 1
+
+def clear_filters(sheet):
+    stay_on("📊 Data View")
+    st.session_state[_filter_count_key(sheet)] = 0
+
+def render_filter_builder(sheet, cfg):
+    """Column / operator / value rows; returns the conditions that have a usable value.
+
+    Only the header row is needed to draw the builder; the whole sheet is loaded
+    for the "in"/"not in" value lists, or by the caller once a condition is usable.
+    """
+    conditions = []
+    n_filters = st.session_state.get(_filter_count_key(sheet), 0)
+    with st.expander("🧮 Filters", expanded=bool(n_filters)):
+        raw = (get_sheet_headers(sheet, GOOGLE_SHEET_ID) or []) if n_filters else []
+        headers = unique_headers(raw)  # as frame columns
+        original = dict(zip(headers, raw))
+        for i in range(n_filters):
+            k = f"vf_{sheet}_{i}"
+            c1, c2, c3 = st.columns([2, 1, 2])
+            with c1:
+                column = st.selectbox("Column", headers, key=f"{k}_col", label_visibility="collapsed")
+            if not column: continue
+            kind = filter_kind(original[column], cfg)
+            with c2:
+                op = st.selectbox("Operator", FILTER_OPS[kind], key=f"{k}_op_{kind}", label_visibility="collapsed")
+            value = None
+            with c3:
+                if op in ("is blank", "not blank", "signed", "not signed"):
+                    pass
+                elif kind == "date":
+                    value = st.date_input("Value", value=(date.today(), date.today()) if op == "between" else date.today(),
+                                          key=f"{k}_val_{op}", label_visibility="collapsed")
+                    if op == "between" and len(value) != 2: continue  # range still being picked
+                elif kind == "number" and op == "between":
+                    lo, hi = st.columns(2)
+                    value = (lo.number_input("From", value=None, key=f"{k}_lo", label_visibility="collapsed"),
+                             hi.number_input("To", value=None, key=f"{k}_hi", label_visibility="collapsed"))
+                    if None in value: continue  # bounds still being typed
+                elif kind == "number":
+                    value = st.number_input("Value", value=None, key=f"{k}_num", label_visibility="collapsed")
+                    if value is None: continue
+                elif op in ("in", "not in"):
+                    _, frame = get_sheet_frame(sheet, GOOGLE_SHEET_ID, cfg, typed=True)
+                    options = sorted(frame[column].astype(str).str.strip().unique()) if column in frame else []
+                    value = st.multiselect("Values", options, key=f"{k}_in", label_visibility="collapsed")
+                    if not value: continue
+                else:
+                    value = st.text_input("Value", key=f"{k}_txt", label_visibility="collapsed")
+                    if value == "" and op == "contains": continue
+            conditions.append({"column": column, "op": op, "value": value})
+        b1, b2 = st.columns(2)
+        b1.button("➕ Add condition", key=f"vf_add_{sheet}", on_click=add_filter, args=(sheet,))
+        b2.button("✖ Clear filters", key=f"vf_clear_{sheet}", on_click=clear_filters, args=(sheet,))
+    return conditions
+
 if render_view:
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.markdown('<div class="section-title">📊 Data View</div>', unsafe_allow_html=True)
@@ -446,10 +911,12 @@ if render_view:
     col1, col2 = st.columns([1,2])
     with col1:
         if st.button("🔄 Refresh Data", on_click=stay_on, args=("📊 Data View",)):
-            st.cache_data.clear(); st.rerun()
+            mirror.forget(GOOGLE_SHEET_ID, view_sheet)  # only this sheet is refetched
+            forget_pages(GOOGLE_SHEET_ID, view_sheet)
+            st.rerun()
     with col2:
         if st.button("✅ Check Sheet Match", key="check_match_view", on_click=stay_on, args=("📊 Data View",)):
-            vh, _ = get_sheet_data(view_sheet, GOOGLE_SHEET_ID)
+            vh, _ = get_sheet_frame(view_sheet, GOOGLE_SHEET_ID)
             cfg = form_configs.get(view_sheet, {})
             resv = diff_config_vs_sheet(cfg, vh)
             if resv["missing_in_sheet"] or resv["extra_in_sheet"] or not resv["order_match"]:
@@ -458,31 +925,119 @@ if render_view:
                 st.success("Perfect match ✅")
 
     if view_sheet:
-        view_headers, view_records = get_sheet_data(view_sheet, GOOGLE_SHEET_ID)
-        view_df = pd.DataFrame(view_records) if view_records else pd.DataFrame()
-        if view_df.empty:
-            st.warning("No data available.")
+        q = st.text_input("🔍 Search…")
+        view_cfg = form_configs.get(view_sheet, {})
+        conditions = render_filter_builder(view_sheet, view_cfg)
+        if q or conditions:  # search and filters need the whole sheet
+            view_version, view_headers, view_df = get_versioned_frame(view_sheet, GOOGLE_SHEET_ID, view_cfg, typed=True)
+            if view_df.empty:
+                st.warning("No data available.")
+            else:
+                kinds = {u: filter_kind(h, view_cfg) for u, h in zip(unique_headers(view_headers), view_headers)}
+                mask = filter_mask(view_df, conditions, kinds)
+                note = "filters only"
+                if q:
+                    index = get_search_index(view_sheet, GOOGLE_SHEET_ID, view_version)
+                    if index is None: st.rerun()  # synced since view_df was read
+                    hits = np.zeros(len(view_df), dtype=bool); hits[index.search(q)] = True
+                    mask &= hits
+                    note = "substring match, all terms"
+                filtered_df = view_df[mask]
+                st.caption(f"Matches: {len(filtered_df)} of {len(view_df)} rows • Cols: {len(view_df.columns)} • "
+                           f"{len(conditions)} filter(s) • {note}")
+                st.dataframe(filtered_df, use_container_width=True, height=520)
         else:
-            st.caption(f"Rows: {len(view_df)} • Cols: {len(view_df.columns)} • Updated: {datetime.now().strftime('%H:%M:%S')}")
-            q = st.text_input("🔍 Search…")
-            filtered_df = view_df if not q else view_df[view_df.astype(str).apply(lambda x: x.str.contains(q, case=False, na=False)).any(axis=1)]
-            st.dataframe(filtered_df, use_container_width=True, height=520)
+            pcol1, pcol2 = st.columns(2)
+            with pcol1:
+                page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key="view_page_size")
+            total = get_sheet_row_count(view_sheet, GOOGLE_SHEET_ID)
+            if total == 0:
+                st.warning("No data available.")
+            elif total is not None:
+                n_pages = max(1, math.ceil(total / page_size))
+                with pcol2:
+                    page = st.number_input(f"Page (1 = latest, {n_pages} total)", min_value=1, max_value=n_pages,
+                                           value=1, step=1, key=f"view_page_{view_sheet}")
+                page_df = get_sheet_page(view_sheet, GOOGLE_SHEET_ID, total, page_size, int(page))
+                if page_df is not None:
+                    page_df = page_df.iloc[::-1]  # newest first, like the page order
+                    st.caption(f"Sheet rows {page_df.index[0]}–{page_df.index[-1]} (newest first) • {total} data rows • "
+                               f"Cols: {len(page_df.columns)} • Updated: {datetime.now().strftime('%H:%M:%S')}")
+                    st.dataframe(page_df, use_container_width=True, height=520)
 
     st.markdown('</div>', unsafe_allow_html=True)
 
 # -------------------------
 # PDF EXPORT
 # -------------------------
+JOBS_LIST_LIMIT = 8
+
+def pick_job_download(job):
+    """Read one finished artifact, once, when the user asks for it (not on every rerun/poll)."""
+    stay_on("📄 PDF Export")
+    try: st.session_state.job_download = (job["id"], get_job_store().read_artifact(job))
+    except FileNotFoundError: st.session_state.job_download = (job["id"], None)
+
+def drop_job_download():
+    stay_on("📄 PDF Export")
+    st.session_state.pop("job_download", None)
+
+def render_job_list():
+    jobs = get_job_store().recent(owner=st.session_state.get("current_user"), limit=JOBS_LIST_LIMIT)
+    if not jobs:
+        st.caption("No export jobs yet."); return False
+    for job in jobs:
+        c1, c2 = st.columns([3, 1])
+        when = datetime.fromtimestamp(job["created"]).strftime("%d %b %H:%M")
+        with c1:
+            st.markdown(f"**{job['label']}** · `{job['id']}` · {when}")
+            if job["status"] == ERROR: st.error(job["message"] or "Failed")
+            elif job["status"] != DONE: st.progress(job["progress"], text=job["message"] or job["status"].capitalize() + "…")
+        with c2:
+            if job["status"] == DONE:
+                picked_id, data = st.session_state.get("job_download", (None, None))
+                if picked_id != job["id"]:
+                    st.button("📦 Get file", key=f"get_job_{job['id']}", on_click=pick_job_download, args=(job,))
+                elif data is None:
+                    st.caption("Expired")
+                else:
+                    st.download_button("⬇️ Download", data=data, file_name=job["filename"], mime=job["mime"],
+                                       key=f"dl_job_{job['id']}", on_click=drop_job_download)
+    return any(j["status"] not in (DONE, ERROR) for j in jobs)
+
+def pick_archive_download(path):
+    stay_on("📄 PDF Export")
+    try:
+        with open(path, "rb") as f: st.session_state.archive_download = (path, f.read())
+    except FileNotFoundError:  # replaced by a newer nightly run meanwhile
+        st.session_state.pop("archive_download", None)
+
+def drop_archive_download():
+    stay_on("📄 PDF Export")
+    st.session_state.pop("archive_download", None)
+
+def render_recent_jobs():
+    st.markdown("**🗂 Recent export jobs**")
+    jobs = get_job_store().recent(owner=st.session_state.get("current_user"), limit=JOBS_LIST_LIMIT)
+    if not any(j["status"] not in (DONE, ERROR) for j in jobs):
+        render_job_list(); return
+    @st.fragment(run_every=2.0)
+    def poll_jobs():
+        if not render_job_list(): st.rerun()  # everything finished -> full rerun stops the polling
+    poll_jobs()
+
 if render_pdf:
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.markdown('<div class="section-title">📝 PDF Export</div>', unsafe_allow_html=True)
 
     available = [n for n in all_sheet_names if n in form_configs]
     pdf_sheet = st.selectbox("Select Sheet", available, key="pdf_sheet")
+    in_background = st.toggle("Run batch and table exports in the background", value=True, key="pdf_bg",
+                              help="Queued exports keep running if you leave this page; results stay downloadable for "
+                                   f"{JOBS_TTL_HOURS:g}h.")
     if pdf_sheet:
-        headers, records = get_sheet_data(pdf_sheet, GOOGLE_SHEET_ID)
-        df = pd.DataFrame(records) if records else pd.DataFrame()
         cfg = form_configs.get(pdf_sheet, {})
+        headers, df = get_sheet_frame(pdf_sheet, GOOGLE_SHEET_ID, cfg)
         if not df.empty:
             st.markdown("**Individual PDFs**")
             rows = st.multiselect("Select Row(s)", df.index + 2, key="pdf_rows")
@@ -491,52 +1046,63 @@ if render_pdf:
                     idx = rownum - 2
                     entry = df.iloc[idx].to_dict()
                     if st.button(f"📄 Generate PDF for Row {rownum}", key=f"gen_{rownum}", on_click=stay_on, args=("📄 PDF Export",)):
-                        html = """
-                        <html><head><meta charset="utf-8">
-                        <style>
-                        body{font-family:Arial;margin:20px;color:#333;line-height:1.6}
-                        .h{border-bottom:2px solid #333;padding-bottom:6px;text-align:center;margin-bottom:12px}
-                        .t{font-size:20px;font-weight:bold}
-                        .s{font-size:14px;font-weight:bold;margin-top:10px}
-                        .y{color:#155724;font-weight:bold}.n{color:#721c24;font-weight:bold}
-                        </style></head>
-                        <body>
-                          <div class="h"><div class="t">{{ title }}</div><div>Row {{ row }} • {{ dt }}</div></div>
-                          <div class="s">📝 Form Data</div>
-                          {% for k,v in form_data.items() %}<div><b>{{ k }}</b>: {{ v if v else '-' }}</div>{% endfor %}
-                          {% if signatures %}
-                            <div class="s">✍️ Signatures</div>
-                            {% for k,v in signatures.items() %}
-                              <div><b>{{ k }}</b>: <span class="{{ 'y' if ('✔️' in v or v|lower=='yes') else 'n' }}">{{ v }}</span></div>
-                            {% endfor %}
-                          {% endif %}
-                        </body></html>
-                        """
-                        pdf_buffer = BytesIO()
-                        rendered = Template(html).render(
-                            title=cfg.get("title", pdf_sheet),
-                            row=rownum, dt=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            form_data={f: entry.get(f,"") for f in cfg.get("fields", [])},
-                            signatures={s: entry.get(s,"❌ No") for s in cfg.get("signatures", [])}
-                        )
-                        pisa_status = pisa.CreatePDF(BytesIO(rendered.encode("utf-8")), dest=pdf_buffer)
-                        if not pisa_status.err:
-                            pdf_buffer.seek(0)
-                            st.success("✅ PDF ready")
+                        try:
+                            pdf_bytes, ts, hit = get_pdf_cache().fetch(pdf_key("row", cfg, pdf_sheet, rownum, entry),
+                                                                       lambda dt: row_pdf(cfg, pdf_sheet, rownum, entry, dt))
+                            st.success("✅ PDF ready" + cached_note(ts, hit))
                             st.download_button(
                                 f"⬇️ Download Row {rownum} PDF",
-                                data=pdf_buffer.getvalue(),
+                                data=pdf_bytes,
                                 file_name=f"{pdf_sheet}_Row_{rownum}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
                                 mime="application/pdf",
                                 key=f"dl_{rownum}",
                                 on_click=stay_on,
                                 args=("📄 PDF Export",)
                             )
+                        except PdfError as e:
+                            st.error(f"❌ {e}")
+
+            st.markdown("---")
+            st.markdown("**Batch PDFs**")
+            batch_all = st.checkbox("All rows (otherwise the rows selected above)", key="batch_all")
+            batch_rows = list(df.index + 2) if batch_all else list(rows)
+            batch_kind = st.radio("Output", ["ZIP (one PDF per row)", "Merged PDF (bookmark per row)"],
+                                  horizontal=True, key="batch_kind")
+            if batch_rows and st.button(f"📦 Generate {len(batch_rows)} PDF(s)", key="gen_batch",
+                                        on_click=stay_on, args=("📄 PDF Export",)):
+                items = list(zip(batch_rows, df.iloc[[r - 2 for r in batch_rows]].to_dict(orient="records")))
+                if in_background:
+                    submit_pdf_job("rows", {"cfg": cfg, "sheet_name": pdf_sheet, "items": items,
+                                            "output": "zip" if batch_kind.startswith("ZIP") else "merged"},
+                                   f"{pdf_sheet}: {len(items)} row PDF(s)")
+                else:
+                    try:
+                        bar = st.progress(0.0, text="Rendering…")
+                        pdfs = batch_row_pdfs(get_pdf_pool(), cfg, pdf_sheet, items, cache=get_pdf_cache(),
+                                              on_progress=lambda d, t: bar.progress(d / t, text=f"Rendered {d}/{t}"))
+                        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                        if batch_kind.startswith("ZIP"):
+                            data, fname, mime = zip_pdfs(pdf_sheet, pdfs), f"{pdf_sheet}_{len(pdfs)}rows_{stamp}.zip", "application/zip"
                         else:
-                            st.error(f"❌ PDF generation error: {pisa_status.err}")
+                            data, fname, mime = merge_pdfs(pdfs), f"{pdf_sheet}_{len(pdfs)}rows_{stamp}.pdf", "application/pdf"
+                        st.success(f"✅ {len(pdfs)} PDF(s) ready")
+                        st.download_button("⬇️ Download batch", data=data, file_name=fname, mime=mime, key="dl_batch",
+                                           on_click=stay_on, args=("📄 PDF Export",))
+                    except Exception as e:
+                        st.error(f"❌ Error generating batch PDFs: {e}")
 
             st.markdown("---")
             st.markdown("**Table PDF**")
+            archived = archived_pdf(sheet_choice, pdf_sheet, PDF_ARCHIVE_DIR)
+            if archived:
+                label = (f"📚 Nightly full register ({archived['rows']} rows, "
+                         f"{datetime.fromtimestamp(archived['generated_at']).strftime('%d %b %H:%M')})")
+                picked_path, data = st.session_state.get("archive_download", (None, None))
+                if picked_path != archived["path"]:
+                    st.button(label, key="get_archived", on_click=pick_archive_download, args=(archived["path"],))
+                else:
+                    st.download_button(f"⬇️ {label}", data=data, file_name=os.path.basename(archived["path"]),
+                                       mime="application/pdf", key="dl_archived", on_click=drop_archive_download)
             sig_cols, fields = cfg.get("signatures", []), cfg.get("fields", [])
             colA, colB, colC = st.columns(3)
             with colA:
@@ -555,83 +1121,53 @@ if render_pdf:
                 rows = list(range(len(df))) if mode=="All" else [r-2 for r in st.multiselect("Pick rows (sheet row numbers):", df.index + 2, key="p_rows")]
                 orient = st.selectbox("Page Orientation", ["Landscape","Portrait"], key="page_orient")
                 include_summary = st.checkbox("Include Signature Summary", value=True, key="incl_sum")
-                if rows and st.button("📊 Generate Table PDF", on_click=stay_on, args=("📄 PDF Export",)):
-                    try:
-                        filtered = df.iloc[rows][cols]
-                        summary = {}
-                        if include_summary:
-                            for s in sel_sigs:
-                                if s in filtered.columns:
-                                    total = len(filtered)
-                                    s_yes = filtered[s].astype(str).str.contains('✔️|Yes', case=False, na=False).sum()
-                                    s_no = filtered[s].astype(str).str.contains('❌|No', case=False, na=False).sum()
-                                    summary[s] = {"signed": s_yes, "not_signed": s_no, "pct": (s_yes/total*100) if total else 0}
-
-                        html = """
-                        <html><head><meta charset="utf-8">
-                        <style>
-                        @page { size: {{ 'landscape' if orientation=='Landscape' else 'portrait' }}; margin:0.5in; }
-                        body{font-family:Arial;margin:0;color:#333;font-size:10px}
-                        .h{text-align:center;margin:10px 0;border-bottom:2px solid #333;padding-bottom:6px}
-                        .t{font-size:18px;font-weight:bold}
-                        .sum{margin:10px;padding:8px;background:#f8f9fa;border:1px solid #dee2e6}
-                        table{width:100%;border-collapse:collapse;margin-top:6px}
-                        th{background:#343a40;color:#fff;border:1px solid #495057;padding:6px 4px;font-size:9px;text-align:left}
-                        td{border:1px solid #dee2e6;padding:6px 4px;font-size:8px}
-                        .signed{background:#d4edda;color:#155724;font-weight:bold;text-align:center}
-                        .not-signed{background:#f8d7da;color:#721c24;text-align:center}
-                        </style></head>
-                        <body>
-                          <div class="h"><div class="t">{{ title }} - Table Export</div>
-                          <div>Generated {{ dt }} • Records: {{ n }} • Columns: {{ m }}</div></div>
-                          {% if include_summary and summary %}
-                            <div class="sum"><b>Signature Summary</b><br/>
-                              {% for k,v in summary.items() %}{{ k }}: ✔️ {{ v.signed }} ({{ "%.1f"|format(v.pct) }}%) • ❌ {{ v.not_signed }}<br/>{% endfor %}
-                            </div>
-                          {% endif %}
-                          <table><thead><tr>{% for c in cols %}<th>{{ c }}</th>{% endfor %}</tr></thead>
-                          <tbody>
-                            {% for row in data %}
-                              <tr>
-                                {% for c in cols %}
-                                  {% set cell = row.get(c, '') %}
-                                  {% if c in sigs %}
-                                    <td class="{{ 'signed' if ('✔️' in (cell|string) or (cell|string)|lower=='yes') else 'not-signed' if ('❌' in (cell|string) or (cell|string)|lower=='no') else '' }}">{{ cell if cell else '-' }}</td>
-                                  {% else %}
-                                    <td>{{ cell if cell else '-' }}</td>
-                                  {% endif %}
-                                {% endfor %}
-                              </tr>
-                            {% endfor %}
-                          </tbody></table>
-                        </body></html>
-                        """
-                        pdf_buffer = BytesIO()
-                        rendered = Template(html).render(
-                            title=cfg.get("title", pdf_sheet),
-                            dt=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            n=len(filtered), m=len(cols), cols=cols, sigs=sel_sigs,
-                            include_summary=include_summary, summary=summary,
-                            data=filtered.to_dict(orient="records"),
-                            orientation=orient
-                        )
-                        pisa_status = pisa.CreatePDF(BytesIO(rendered.encode("utf-8")), dest=pdf_buffer)
-                        if not pisa_status.err:
-                            pdf_buffer.seek(0)
-                            st.success("✅ Table PDF ready")
+                engine = st.radio("Engine", ["Fast (ReportLab)", "HTML (xhtml2pdf)"], horizontal=True, key="table_engine",
+                                  help="Fast draws the table directly; HTML renders the template through xhtml2pdf.")
+                engine_key = "fast" if engine.startswith("Fast") else "html"
+                if engine_key == "html" and st.checkbox(
+                        f"Render in parallel chunks of {TABLE_CHUNK_ROWS} rows", key="table_chunked",
+                        help="Faster for long tables, but each chunk starts on a new page, "
+                             "so the PDF has part-empty pages at the chunk boundaries."):
+                    engine_key = "html-chunked"
+                if rows and st.button("📊 Generate Table PDF", key="gen_table", on_click=stay_on, args=("📄 PDF Export",)):
+                    filtered = df.iloc[rows][cols]
+                    if in_background:
+                        submit_pdf_job("table", {"cfg": cfg, "sheet_name": pdf_sheet, "columns": cols,
+                                                 "rows": filtered.astype(object).values.tolist(), "sigs": sel_sigs,
+                                                 "orientation": orient, "include_summary": include_summary,
+                                                 "engine": engine_key, "chunk_rows": TABLE_CHUNK_ROWS},
+                                       f"{pdf_sheet}: table of {len(filtered)} row(s)")
+                    else:
+                        try:
+                            bar = st.progress(0.0, text="Rendering…")
+                            if engine_key == "fast":  # one worker process, off the server's GIL
+                                render = lambda dt: get_pdf_pool().submit(fast_table_pdf, cfg, pdf_sheet, filtered, sel_sigs,
+                                                                          orient, include_summary, dt).result()
+                            elif engine_key == "html":
+                                render = lambda dt: get_pdf_pool().submit(table_pdf, cfg, pdf_sheet, filtered, sel_sigs,
+                                                                          orient, include_summary, dt).result()
+                            else:
+                                render = lambda dt: parallel_table_pdf(get_pdf_pool(), cfg, pdf_sheet, filtered, sel_sigs, orient,
+                                                                       include_summary, chunk_rows=TABLE_CHUNK_ROWS, dt=dt,
+                                                                       on_progress=lambda d, t: bar.progress(d / t, text=f"Rendered chunk {d}/{t}"))
+                            pdf_bytes, ts, hit = get_pdf_cache().fetch(
+                                pdf_key("table", cfg, pdf_sheet, filtered, sel_sigs, orient, include_summary, engine_key), render)
+                            bar.empty()
+                            st.success("✅ Table PDF ready" + cached_note(ts, hit))
                             st.download_button(
                                 "⬇️ Download Table PDF",
-                                data=pdf_buffer.getvalue(),
+                                data=pdf_bytes,
                                 file_name=f"{pdf_sheet}_Table_{len(filtered)}rows_{len(cols)}cols_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
                                 mime="application/pdf",
                                 key="dl_table_pdf",
                                 on_click=stay_on,
                                 args=("📄 PDF Export",)
                             )
-                        else:
-                            st.error(f"❌ PDF generation error: {pisa_status.err}")
-                    except Exception as e:
-                        st.error(f"❌ Error generating table PDF: {e}")
+                        except Exception as e:
+                            st.error(f"❌ Error generating table PDF: {e}")
+
+    st.markdown("---")
+    render_recent_jobs()
 
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -660,7 +1196,9 @@ if render_mgmt:
                 st.write("Signatures:"); [st.write("• "+s) for s in cfg_tmp.get("signatures", [])]
         if st.button("✅ Create New Sheet", type="primary") and new_name and headers_new:
             if new_name not in current:
-                if create_new_worksheet(new_name, headers_new): st.balloons(); st.rerun()
+                fut = api_scheduler.submit(None, create_new_worksheet, new_name, headers_new, GOOGLE_SHEET_ID, {"created": False})
+                track_pending(f"Create sheet '{new_name}'", fut, f"✅ Sheet '{new_name}' created.")
+                st.info("⏳ Creating sheet…")
             else:
                 st.error("❌ Sheet name already exists!")
 
@@ -669,11 +1207,13 @@ if render_mgmt:
         if current:
             to_del = st.selectbox("Select sheet to delete", current)
             if to_del:
-                h, r = get_sheet_data(to_del, GOOGLE_SHEET_ID)
-                st.caption(f"Rows: {len(r) if r else 0} • Columns: {len(h) if h else 0} • Has Config: {'✅' if to_del in form_configs else '❌'}")
+                h, r = get_sheet_frame(to_del, GOOGLE_SHEET_ID)
+                st.caption(f"Rows: {len(r)} • Columns: {len(h) if h else 0} • Has Config: {'✅' if to_del in form_configs else '❌'}")
             st.error("⚠️ This action cannot be undone.")
             if st.checkbox(f"I understand and want to delete '{to_del}'") and st.button("🗑️ Delete Sheet", type="secondary"):
-                if delete_worksheet(to_del): st.success("Sheet deleted."); st.rerun()
+                fut = api_scheduler.submit(None, delete_worksheet, to_del, GOOGLE_SHEET_ID)
+                track_pending(f"Delete sheet '{to_del}'", fut, f"🗑️ Sheet '{to_del}' deleted.")
+                st.info("⏳ Deleting sheet…")
         else:
             st.info("No worksheets available.")
 
@@ -689,7 +1229,7 @@ if render_diag:
     selectable = [s for s in all_sheet_names if s in form_configs]
     diag_sheet = st.selectbox("Select sheet", selectable)
     if st.button("Run Check", on_click=stay_on, args=("🧪 Diagnostics",)):
-        h, _ = get_sheet_data(diag_sheet, GOOGLE_SHEET_ID)
+        h, _ = get_sheet_frame(diag_sheet, GOOGLE_SHEET_ID)
         cfg = form_configs.get(diag_sheet, {})
         r = diff_config_vs_sheet(cfg, h)
         if r["missing_in_sheet"] or r["extra_in_sheet"] or not r["order_match"]:
@@ -703,10 +1243,45 @@ if render_diag:
         else:
             st.success("Perfect match ✅")
 
+    if st.button("🔥 Load ALL sheets (both files)", on_click=stay_on, args=("🧪 Diagnostics",)):
+        # concurrent batched reads straight into the mirror; progress renders as batches land
+        jobs = []
+        for label, sid in SHEET_IDS.items():
+            on_result = functools.partial(lambda sid, n, v: mirror.replace(sid, n, v), sid)
+            jobs.append((label, get_fetch_engine().start(get_backend(sid), get_all_sheet_names(sid), on_result=on_result)))
+        st.session_state.warm_jobs = {"jobs": jobs, "t0": time.time()}
+
+    warm = st.session_state.get("warm_jobs")
+    if warm:
+        done_n = sum(j.completed for _, j in warm["jobs"]); total = sum(j.total for _, j in warm["jobs"])
+        st.progress(done_n / total if total else 1.0, text=f"Loaded {done_n}/{total} sheets")
+        for label, job in warm["jobs"]:
+            if job.errors: st.error(f"{label}: {len(job.errors)} sheet(s) failed — {next(iter(job.errors.values()))}")
+            _run_pending.extend(f for f in job.futures if not f.done())
+        if all(j.done() for _, j in warm["jobs"]):
+            if "elapsed" not in warm: warm["elapsed"] = time.time() - warm["t0"]
+            st.caption(f"All sheets mirrored in {warm['elapsed']:.1f}s")
+            with st.expander("Loaded sheets", expanded=False):
+                st.dataframe(pd.DataFrame([{"File": label, "Sheet": n, "Rows": max(len(v) - 1, 0)}
+                                           for label, job in warm["jobs"] for n, v in job.results.items()]),
+                             use_container_width=True, hide_index=True)
+
     if st.button("Scan ALL", on_click=stay_on, args=("🧪 Diagnostics",)):
-        rows = []
-        for name in selectable:
-            hh, _ = get_sheet_data(name, GOOGLE_SHEET_ID)
+        # header-only scan: row 1 of every sheet in a single batch request
+        names = tuple(selectable)
+        st.session_state.scan_all = {"sheet_id": GOOGLE_SHEET_ID, "names": names,
+            "future": api_scheduler.submit(("headers", GOOGLE_SHEET_ID, names), fetch_headers_batch, GOOGLE_SHEET_ID, names)}
+
+    scan = st.session_state.get("scan_all")
+    if scan and scan["sheet_id"] == GOOGLE_SHEET_ID and not scan["future"].done():
+        _run_pending.append(scan["future"]); st.info("⏳ Scanning headers…")
+    elif scan and scan["sheet_id"] == GOOGLE_SHEET_ID and scan["future"].exception() is not None:
+        api_scheduler.forget(("headers", GOOGLE_SHEET_ID, scan["names"]))
+        st.error(f"Error fetching headers: {scan['future'].exception()}"); st.session_state.pop("scan_all")
+    elif scan and scan["sheet_id"] == GOOGLE_SHEET_ID:
+        rows, all_headers = [], scan["future"].result()
+        for name in scan["names"]:
+            hh = all_headers.get(name, [])
             cfg = form_configs.get(name, {})
             r = diff_config_vs_sheet(cfg, hh)
             rows.append({
@@ -716,6 +1291,7 @@ if render_diag:
                 "Order OK": "Yes" if r["order_match"] else "No",
             })
         if rows:
+            st.caption(f"Scanned {len(rows)} sheets (1 API call)")
             st.dataframe(pd.DataFrame(rows).sort_values(["Missing","Extra","Order OK"], ascending=[False, False, True]),
                          use_container_width=True, hide_index=True)
         else:
@@ -723,6 +1299,26 @@ if render_diag:
 
     st.markdown('</div>', unsafe_allow_html=True)
 
+# -------------------------
+# PENDING GOOGLE CALLS (polled, never awaited on the script thread)
+# -------------------------
+still_pending = []
+for op in st.session_state.get("pending_ops", []):
+    fut = op["future"]
+    if not fut.done(): still_pending.append(op)
+    elif fut.exception() is not None: st.toast(f"❌ {op['label']} failed: {fut.exception()}", icon="❌")
+    else: st.toast(op["ok"].format(result=fut.result()), icon="✅")
+st.session_state.pending_ops = still_pending
+waiting_on = [op["future"] for op in still_pending] + _run_pending
+
+if waiting_on:
+    @st.fragment(run_every=1.0)
+    def poll_pending():
+        n = sum(not f.done() for f in waiting_on)
+        if n < len(waiting_on): st.rerun()
+        st.caption(f"⏳ {n} Google request(s) in progress…")
+    poll_pending()
+
 # -------------------------
 # SIDEBAR STATUS (keep)
 # -------------------------
@@ -730,7 +1326,7 @@ st.sidebar.markdown("---")
 st.sidebar.metric("Sheet Type", sheet_choice)
 st.sidebar.metric("Available Forms", len(form_configs))
 st.sidebar.metric("Total Worksheets", len(all_sheet_names))
-current_calls = len(st.session_state.get('api_calls', []))
+current_calls = quota_manager.usage()  # project-wide, last 60s
 qp = (current_calls / quota_manager.max_calls) * 100 if quota_manager.max_calls else 0
 if qp > 80: st.sidebar.error(f"⚠️ API Usage: {current_calls}/{quota_manager.max_calls} ({qp:.1f}%)")
 elif qp > 60: st.sidebar.warning(f"🔶 API Usage: {current_calls}/{quota_manager.max_calls} ({qp:.1f}%)")
@@ -0,0 +1,296 @@
+"""Storage backends for the IMS spreadsheets.
+
+`SheetBackend` is the small set of operations the app and the admin scripts
+need. `GoogleSheetsBackend` talks to one spreadsheet through gspread;
+`LocalBackend` keeps the same data in SQLite (`:memory:` by default) so the app
+can be benchmarked offline or run local-primary with Google Sheets only as an
+export target (see `copy_worksheets`).
+"""
+import re
+from typing import Protocol
+
+from ims_mirror import SheetMirror
+from ims_quota import shared_bucket
+
+SHEET_IDS = {
+    "LW FILES": "1wxntHZp4xEQWCmLAt2TVF8ohG6uHuvV_3QbaK7wSwGw",
+    "M&PR FILES": "17KL-cKMJNGncAJngla_eX6aVdzvoihbdpgOJqOiGycc",
+}
+
+SCOPE = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+CREDENTIAL_FILE = "imscredentials.json"
+
+DRIVE_FILE_URL = "https://www.googleapis.com/drive/v3/files/{}"
+
+
+# =========================
+# A1 helpers
+# =========================
+def a1_range(sheet_name, rng=None):
+    quoted = "'{}'".format(sheet_name.replace("'", "''"))
+    return f"{quoted}!{rng}" if rng else quoted
+
+
+def col_to_letters(col):
+    out = ""
+    while col:
+        col, rem = divmod(col - 1, 26)
+        out = chr(65 + rem) + out
+    return out
+
+
+def rowcol_to_a1(row, col):
+    return f"{col_to_letters(col)}{row}"
+
+
+def _letters_to_col(letters):
+    col = 0
+    for ch in letters.upper(): col = col * 26 + (ord(ch) - 64)
+    return col
+
+
+_A1_CELL = re.compile(r"^([A-Za-z]*)(\d*)$")
+
+def parse_a1(rng):
+    """'B2:D5' -> (2, 2, 5, 4); open ends ('A:A', '1:1', 'A2:F') come back as None."""
+    if "!" in rng: rng = rng.rsplit("!", 1)[1]
+    start, _, end = rng.replace("$", "").partition(":")
+    parts = []
+    for ref in (start, end or start):
+        m = _A1_CELL.match(ref)
+        if not m: raise ValueError(f"Bad A1 range: {rng}")
+        parts.append((int(m.group(2)) if m.group(2) else None, _letters_to_col(m.group(1)) if m.group(1) else None))
+    (r1, c1), (r2, c2) = parts
+    return r1, c1, r2, c2
+
+
+def cell_ranges(cells):
+    """[(row, col, value), ...] -> batch_update data; vertical runs in one column share a range."""
+    runs = []
+    for r, c, v in sorted(cells, key=lambda t: (t[1], t[0])):
+        if runs and runs[-1][1] == c and runs[-1][0] + len(runs[-1][2]) == r:
+            runs[-1][2].append([v])
+        else:
+            runs.append((r, c, [[v]]))
+    return [{"range": rowcol_to_a1(r, c) + (f":{rowcol_to_a1(r + len(vals) - 1, c)}" if len(vals) > 1 else ""),
+             "values": vals} for r, c, vals in runs]
+
+
+def _first_row_of(updated_range):
+    r1, _, _, _ = parse_a1(updated_range)
+    return r1
+
+
+# =========================
+# Protocol
+# =========================
+class SheetBackend(Protocol):
+    sheet_id: str
+
+    def list_worksheets(self): ...
+    def get_values(self, sheet_name, rng=None): ...
+    def last_row(self, sheet_name): ...
+    def batch_get(self, ranges): ...
+    def append_rows(self, sheet_name, rows): ...
+    def update_range(self, sheet_name, rng, rows): ...
+    def batch_update(self, sheet_name, data): ...
+    def add_worksheet(self, sheet_name, headers, rows=100, cols=None): ...
+    def delete_worksheet(self, sheet_name): ...
+    def rename_worksheet(self, old_name, new_name): ...
+    def revision(self): ...
+
+
+# =========================
+# Google Sheets
+# =========================
+def google_client(credential_file=CREDENTIAL_FILE):
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+    creds = ServiceAccountCredentials.from_json_keyfile_name(credential_file, SCOPE)
+    return gspread.authorize(creds)
+
+
+class GoogleSheetsBackend:
+    """Uses spreadsheet-level values_* calls so no worksheet metadata fetch is needed per operation.
+
+    With a `quota` (ims_quota.TokenBucket) every API request first takes a token from it.
+    """
+
+    def __init__(self, spreadsheet, quota=None):
+        self.sh, self.sheet_id, self.quota = spreadsheet, spreadsheet.id, quota
+
+    def _spend(self, n=1):
+        if self.quota is not None: self.quota.acquire(n)
+
+    def list_worksheets(self):
+        self._spend()
+        return [ws.title for ws in self.sh.worksheets()]
+
+    def get_values(self, sheet_name, rng=None):
+        self._spend()
+        return self.sh.values_get(a1_range(sheet_name, rng)).get("values", [])
+
+    def last_row(self, sheet_name, probe=200):
+        """Last sheet row holding any value (1 = headers only).
+
+        The grid size comes from the worksheet metadata; trailing blank grid
+        rows are trimmed by reading whole-row windows upwards from the bottom
+        (values_get drops trailing empty rows), `probe` rows first, then doubling.
+        """
+        self._spend()
+        end = self.sh.worksheet(sheet_name).row_count
+        while end > 1:
+            start = max(1, end - probe + 1)
+            rows = self.get_values(sheet_name, f"{start}:{end}")
+            if any(any(v != "" for v in r) for r in rows):
+                return start + max(i for i, r in enumerate(rows) if any(v != "" for v in r))
+            end, probe = start - 1, probe * 2
+        return 1
+
+    def batch_get(self, ranges):
+        """ranges: [(sheet_name, rng_or_None), ...] -> list of value grids, same order."""
+        if not ranges: return []
+        self._spend()
+        resp = self.sh.values_batch_get([a1_range(n, r) for n, r in ranges])
+        return [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+
+    def append_rows(self, sheet_name, rows):
+        """Returns the sheet row number the first appended row landed on."""
+        self._spend()
+        resp = self.sh.values_append(a1_range(sheet_name, "A1"), {"valueInputOption": "RAW"}, {"values": rows})
+        return _first_row_of(resp["updates"]["updatedRange"])
+
+    def update_range(self, sheet_name, rng, rows):
+        self._spend()
+        return self.sh.values_update(a1_range(sheet_name, rng), {"valueInputOption": "RAW"}, {"values": rows})
+
+    def batch_update(self, sheet_name, data):
+        """data: [{"range": "B4", "values": [["x"]]}, ...] in one request."""
+        if not data: return None
+        self._spend()
+        body = {"valueInputOption": "RAW",
+                "data": [{"range": a1_range(sheet_name, d["range"]), "values": d["values"]} for d in data]}
+        return self.sh.values_batch_update(body)
+
+    def add_worksheet(self, sheet_name, headers, rows=100, cols=None):
+        self._spend()
+        self.sh.add_worksheet(title=sheet_name, rows=str(rows), cols=str(max(cols or len(headers), 1)))
+        if headers: self.update_range(sheet_name, "A1", [list(headers)])
+
+    def delete_worksheet(self, sheet_name):
+        self._spend(2)
+        self.sh.del_worksheet(self.sh.worksheet(sheet_name))
+
+    def rename_worksheet(self, old_name, new_name):
+        self._spend(2)
+        self.sh.worksheet(old_name).update_title(new_name)
+
+    def revision(self):
+        """Cheap freshness probe: Drive modifiedTime + version of the spreadsheet file.
+
+        Goes to the Drive API, which has its own quota, so no Sheets token is taken.
+        """
+        client = self.sh.client
+        http = getattr(client, "http_client", client)  # gspread 6 moved request() to http_client
+        meta = http.request("get", DRIVE_FILE_URL.format(self.sheet_id),
+                            params={"fields": "modifiedTime,version", "supportsAllDrives": "true"}).json()
+        return f"{meta.get('modifiedTime')}#{meta.get('version')}"
+
+
+# =========================
+# Local (SQLite / in-memory)
+# =========================
+class LocalBackend:
+    def __init__(self, sheet_id="local", store=None):
+        self.sheet_id = sheet_id
+        self.store = store if isinstance(store, SheetMirror) else SheetMirror(store or ":memory:")
+
+    def list_worksheets(self):
+        return self.store.names(self.sheet_id)
+
+    def get_values(self, sheet_name, rng=None):
+        grid = self.store.read(self.sheet_id, sheet_name)
+        if grid is None: raise KeyError(f"Worksheet '{sheet_name}' not found")
+        if not rng: return grid
+        r1, c1, r2, c2 = parse_a1(rng)
+        rows = grid[(r1 or 1) - 1:r2]
+        lo, hi = (c1 or 1) - 1, c2
+        out = [row[lo:hi] for row in rows]
+        while out and not any(out[-1]): out.pop()
+        return out
+
+    def last_row(self, sheet_name):
+        n = self.store.row_count(self.sheet_id, sheet_name)
+        if n is None: raise KeyError(f"Worksheet '{sheet_name}' not found")
+        return n
+
+    def batch_get(self, ranges):
+        return [self.get_values(n, r) for n, r in ranges]
+
+    def append_rows(self, sheet_name, rows):
+        return self.store.append_rows(self.sheet_id, sheet_name, rows)
+
+    def update_range(self, sheet_name, rng, rows):
+        r1, c1, _, _ = parse_a1(rng)
+        r1, c1 = r1 or 1, c1 or 1
+        self.store.update_cells(self.sheet_id, sheet_name,
+                                [(r1 + i, c1 + j, v) for i, row in enumerate(rows) for j, v in enumerate(row)], create=True)
+
+    def batch_update(self, sheet_name, data):
+        cells = []
+        for d in data:
+            r1, c1, _, _ = parse_a1(d["range"])
+            cells += [((r1 or 1) + i, (c1 or 1) + j, v) for i, row in enumerate(d["values"]) for j, v in enumerate(row)]
+        if cells: self.store.update_cells(self.sheet_id, sheet_name, cells, create=True)
+
+    def add_worksheet(self, sheet_name, headers, rows=100, cols=None):
+        self.store.create(self.sheet_id, sheet_name, headers)
+
+    def delete_worksheet(self, sheet_name):
+        self.store.forget(self.sheet_id, sheet_name)
+
+    def rename_worksheet(self, old_name, new_name):
+        self.store.rename(self.sheet_id, old_name, new_name)
+
+    def revision(self):
+        return self.store.revision(self.sheet_id)
+
+
+# =========================
+# Factory / utilities
+# =========================
+def open_backend(sheet_id, kind="google", credential_file=CREDENTIAL_FILE, local_path="ims_local.sqlite3",
+                 client=None, quota="shared"):
+    """quota: a TokenBucket, None to disable, or "shared" for the cross-process bucket in ims_quota.sqlite3."""
+    if kind == "local":
+        return LocalBackend(sheet_id, local_path)
+    if quota == "shared": quota = shared_bucket()
+    client = client or google_client(credential_file)
+    if quota is not None: quota.acquire()  # open_by_key fetches metadata
+    return GoogleSheetsBackend(client.open_by_key(sheet_id), quota=quota)
+
+
+def read_all_worksheets(backend, batch=20):
+    """{worksheet_name: all_values} using one batch_get per `batch` worksheets."""
+    names, out = backend.list_worksheets(), {}
+    for i in range(0, len(names), batch):
+        chunk = names[i:i+batch]
+        out.update(zip(chunk, backend.batch_get([(n, None) for n in chunk])))
+    return out
+
+
+def copy_worksheets(src, dst, names=None):
+    """Export worksheets from one backend to another (e.g. local primary -> Google)."""
+    existing = set(dst.list_worksheets())
+    data = read_all_worksheets(src)
+    for name in (names or data):
+        values = data.get(name) or []
+        if name not in existing:
+            dst.add_worksheet(name, values[0] if values else [], rows=max(len(values), 100))
+        if values:
+            dst.update_range(name, "A1", values)
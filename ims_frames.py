@@ -0,0 +1,274 @@
+"""DataFrame construction straight from a sheet's value grid.
+
+`frame_from_grid` transposes the grid column-wise in one pass (rows padded or
+truncated to the header width by zip_longest) instead of building a dict per
+row. Column kinds come from the form config: an optional `"types"` mapping of
+header -> "date" | "number" | "category" | "text", else inferred from the name.
+"""
+from itertools import islice, zip_longest
+import operator, re, warnings
+
+import numpy as np
+import pandas as pd
+
+DATE_PAT = re.compile(r"\bdate\b|\bdue\b|\bdoa\b", re.I)
+NUMBER_PAT = re.compile(r"\bqty\b|\bquantity\b|\bbalance\b", re.I)
+ISO_DATE_PAT = re.compile(r"\d{4}-\d{1,2}-\d{1,2}(?:[ T][\d:.]+)?$")
+CATEGORY_PAT = re.compile(r"\bshop\b|\bstatus\b|\bsign|\bapproved by\b|\bverified by\b|\bchecked by\b|\breviewed by\b", re.I)
+AUTO_CATEGORY_MIN_ROWS = 50  # text columns repeating this much get stored as categoricals
+
+
+def column_kind(header, cfg=None):
+    cfg = cfg or {}
+    declared = cfg.get("types", {}).get(header)
+    if declared: return declared
+    if header in cfg.get("signatures", []): return "category"
+    if DATE_PAT.search(header): return "date"
+    if NUMBER_PAT.search(header): return "number"
+    if CATEGORY_PAT.search(header): return "category"
+    return "text"
+
+
+def column_kinds(headers, cfg=None):
+    return {h: column_kind(h, cfg) for h in headers}
+
+
+def filter_kind(header, cfg=None):
+    """column_kind, except configured signature columns filter by signed state."""
+    kind = column_kind(header, cfg)
+    if header in (cfg or {}).get("signatures", []) and kind == "category": return "signature"
+    return kind
+
+
+def to_dates(col):
+    """Per-value date parsing used by typed frames, filters and import checks; unparsable -> NaT.
+
+    ISO values (2024-03-05) are read year-month-day; everything else is parsed
+    value by value, day first, so one column may mix "20/03/2024" and "5 Mar 2024".
+    """
+    text = pd.Series(col, copy=False).astype(str).str.strip()
+    iso = text.str.match(ISO_DATE_PAT).to_numpy(dtype=bool)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # dateutil fallback warnings
+        out = pd.to_datetime(text.where(~iso), errors="coerce", dayfirst=True, format="mixed")
+        if iso.any(): out[iso] = pd.to_datetime(text[iso], errors="coerce", format="ISO8601")
+    return out
+
+
+def _as_dates(col, blank):
+    parsed = to_dates(col)
+    return parsed if not (parsed.isna() & ~blank).any() else None
+
+
+def _as_numbers(col, blank):
+    parsed = pd.to_numeric(col.str.replace(",", "", regex=False).where(~blank), errors="coerce")
+    if (parsed.isna() & ~blank).any(): return None
+    if not blank.any() and (parsed % 1 == 0).all(): return pd.to_numeric(parsed, downcast="integer")
+    return pd.to_numeric(parsed, downcast="float")
+
+
+def unique_headers(headers):
+    """Headers with repeats suffixed ".1", ".2", ... (as pandas.read_csv does), so each column has its own name.
+
+    Sheets often carry several blank "" header columns; left as-is, frame[name] would return a DataFrame.
+    """
+    seen, counts, out = set(headers), {}, []
+    for h in headers:
+        if h in counts:
+            while True:
+                counts[h] += 1
+                alt = f"{h}.{counts[h]}"
+                if alt not in seen: break
+            seen.add(alt); out.append(alt)
+        else:
+            counts[h] = 0; out.append(h)
+    return out
+
+
+def _as_text(col, kind):
+    if kind == "category" or (len(col) >= AUTO_CATEGORY_MIN_ROWS and col.nunique() * 2 <= len(col)):
+        return col.astype("category")
+    return col
+
+
+def frame_from_grid(values, cfg=None, typed=True):
+    """DataFrame (0-based index = sheet row - 2) from a get_all_values()-style grid.
+
+    typed=False keeps every cell as its original string (categoricals are still
+    used for repetitive columns, which is lossless); typed=True also converts
+    date and number columns when every non-blank cell parses.
+    """
+    if not values: return pd.DataFrame()
+    headers = list(values[0])
+    width, body = len(headers), values[1:]
+    if not body: return pd.DataFrame(columns=unique_headers(headers))
+    n = len(body)
+    columns = list(islice(zip_longest(*body, fillvalue=""), width))
+    columns += [("",) * n] * (width - len(columns))
+    kinds = column_kinds(headers, cfg)
+    data = {}
+    for i, (h, raw) in enumerate(zip(headers, columns)):
+        col = pd.Series(np.asarray(raw, dtype=object), copy=False)
+        kind, out = kinds[h], None
+        if typed and kind in ("date", "number"):
+            blank = col.str.strip().eq("")
+            out = _as_dates(col, blank) if kind == "date" else _as_numbers(col, blank)
+        data[i] = out if out is not None else _as_text(col, kind)
+    frame = pd.DataFrame(data, copy=False)
+    frame.columns = unique_headers(headers)
+    return frame
+
+
+def cell_diff(before, after, first_row=2):
+    """[(sheet_row, sheet_col, new_value)] (1-based) for every cell whose string value changed.
+
+    Both frames must have the same shape and row order; row 0 is sheet row `first_row`.
+    """
+    a = before.astype(object).fillna("").astype(str).to_numpy()
+    b = after.astype(object).fillna("").astype(str).to_numpy()
+    rows, cols = np.nonzero(a != b)
+    return [(int(r) + first_row, int(c) + 1, b[r, c]) for r, c in zip(rows, cols)]
+
+
+def _text_at(frame, row, col):
+    v = frame.iat[frame.index.get_loc(row), col - 1]
+    return "" if v is None or (isinstance(v, float) and np.isnan(v)) else str(v)
+
+
+def stale_cells(base, current, cells):
+    """Cells [(sheet_row, sheet_col, ...)] whose value in `current` no longer matches `base`.
+
+    Both frames are indexed by sheet row; a changed header row or a vanished row
+    makes every affected cell stale.
+    """
+    if list(base.columns) != list(current.columns): return list(cells)
+    return [c for c in cells if c[0] not in current.index or _text_at(base, c[0], c[1]) != _text_at(current, c[0], c[1])]
+
+
+def stale_rows(base, current, rows):
+    """Sheet rows whose contents changed (or vanished) between `base` and `current`."""
+    width = base.shape[1]
+    return sorted({r for r, _ in stale_cells(base, current, [(r, c) for r in rows for c in range(1, width + 1)])})
+
+
+class SearchIndex:
+    """Free-text search over a frame, built once per data version.
+
+    Keeps one lowercase text column per row (cells joined with a separator so a
+    term never matches across two cells). Queries are whitespace-separated
+    terms, ANDed, each matched as a case-insensitive substring at every size.
+    Sheets with at least `TOKEN_INDEX_MIN_ROWS` rows also get a token -> rows
+    index: a term's words are looked up in the (much smaller) token vocabulary
+    to find candidate rows, and only those are checked against the full term.
+    """
+    TOKEN_INDEX_MIN_ROWS = 5000
+    SEP = "\x1f"
+
+    def __init__(self, frame):
+        text = None
+        for i in range(frame.shape[1]):
+            col = frame.iloc[:, i].astype(str).reset_index(drop=True)
+            text = col if text is None else text + self.SEP + col
+        self.text = (text if text is not None else pd.Series([""] * len(frame))).str.lower()
+        self.vocab = self.starts = self.rows = None
+        if len(frame) >= self.TOKEN_INDEX_MIN_ROWS:
+            tok = self.text.str.findall(r"\w+").explode().dropna()
+            pairs = pd.DataFrame({"tok": tok.to_numpy(dtype=object), "row": tok.index.to_numpy()})
+            pairs = pairs.drop_duplicates().sort_values(["tok", "row"], kind="stable")
+            tokens, self.rows = pairs["tok"].to_numpy(dtype=object), pairs["row"].to_numpy()
+            vocab, starts = np.unique(tokens, return_index=True)
+            self.vocab, self.starts = pd.Series(vocab, dtype=object), np.append(starts, len(tokens))
+
+    @property
+    def mode(self):
+        return "indexed" if self.vocab is not None else "scan"
+
+    def _rows_containing(self, word):
+        """Rows with a token containing `word` (= rows whose text contains it, for a word-only string)."""
+        hit = np.flatnonzero(self.vocab.str.contains(word, regex=False).to_numpy(dtype=bool))
+        if not len(hit): return hit
+        return np.unique(np.concatenate([self.rows[self.starts[i]:self.starts[i + 1]] for i in hit]))
+
+    def search(self, query):
+        """Positional row indices (sorted) matching every term of `query`."""
+        terms = query.lower().split()
+        if not terms: return np.arange(len(self.text))
+        if self.vocab is None:
+            mask = np.ones(len(self.text), dtype=bool)
+            for t in terms: mask &= self.text.str.contains(t, regex=False).to_numpy()
+            return np.flatnonzero(mask)
+        hits = None
+        for t in terms:
+            words = re.findall(r"\w+", t)
+            if not words:  # punctuation only: nothing to look up
+                rows = np.flatnonzero(self.text.str.contains(t, regex=False).to_numpy())
+            else:
+                rows = None
+                for w in words:
+                    found = self._rows_containing(w)
+                    rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+                    if not len(rows): break
+                if words != [t] and len(rows):  # candidates; confirm the whole term
+                    rows = rows[self.text.iloc[rows].str.contains(t, regex=False).to_numpy()]
+            hits = rows if hits is None else np.intersect1d(hits, rows, assume_unique=True)
+            if not len(hits): return hits
+        return hits
+
+
+# =========================
+# Structured filters
+# =========================
+FILTER_OPS = {
+    "date": ["<", "<=", ">", ">=", "==", "between", "is blank", "not blank"],
+    "number": ["<", "<=", ">", ">=", "==", "!=", "between", "is blank", "not blank"],
+    "category": ["==", "!=", "in", "not in", "contains", "is blank", "not blank"],
+    "text": ["contains", "==", "!=", "in", "not in", "is blank", "not blank"],
+    "signature": ["signed", "not signed"],
+}
+SIGNED_PAT = re.compile(r"✔|\byes\b", re.I)
+_COMPARE = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+            "==": operator.eq, "!=": operator.ne}
+
+
+def _column(frame, name):
+    return frame.iloc[:, list(frame.columns).index(name)]  # first match if headers repeat
+
+
+def condition_mask(col, kind, op, value=None):
+    """Boolean ndarray for one condition over one column."""
+    if op in ("is blank", "not blank"):
+        blank = col.isna().to_numpy() | col.astype(str).str.strip().eq("").to_numpy()
+        return blank if op == "is blank" else ~blank
+    if op in ("signed", "not signed"):
+        signed = col.astype(str).str.contains(SIGNED_PAT).to_numpy(dtype=bool)
+        return signed if op == "signed" else ~signed
+    if kind in ("date", "number"):
+        if kind == "date":
+            vals = col if pd.api.types.is_datetime64_any_dtype(col) else to_dates(col.astype(str))
+            vals, cast = vals.dt.normalize(), pd.Timestamp
+        else:
+            vals = col if pd.api.types.is_numeric_dtype(col) else pd.to_numeric(col.astype(str).str.replace(",", ""), errors="coerce")
+            cast = float
+        if op == "between":
+            lo, hi = value
+            out = (vals >= cast(lo)) & (vals <= cast(hi))
+        else:
+            out = _COMPARE[op](vals, cast(value))
+        return out.fillna(False).to_numpy(dtype=bool)
+    vals = col.astype(str).str.strip()
+    if op == "contains":
+        return vals.str.contains(str(value), case=False, regex=False).to_numpy(dtype=bool)
+    if op in ("in", "not in"):
+        hit = vals.isin([str(v).strip() for v in (value or [])]).to_numpy(dtype=bool)
+        return hit if op == "in" else ~hit
+    hit = vals.str.lower().eq(str(value).strip().lower()).to_numpy(dtype=bool)
+    return hit if op == "==" else ~hit
+
+
+def filter_mask(frame, conditions, kinds):
+    """AND of every {"column", "op", "value"} condition -> boolean ndarray over the frame's rows."""
+    mask = np.ones(len(frame), dtype=bool)
+    for c in conditions:
+        if c["column"] not in frame.columns: continue
+        mask &= condition_mask(_column(frame, c["column"]), kinds.get(c["column"], "text"), c["op"], c.get("value"))
+    return mask
@@ -0,0 +1,216 @@
+"""Background PDF export jobs.
+
+`JobStore` is a small SQLite queue shared by the app and the worker: the app
+`submit`s a job (kind + JSON params) and gets an id back; a worker process
+`claim`s queued jobs, reports progress, and writes the finished artifact to
+`artifact_dir`. Jobs and their files are purged `ttl` seconds after they were
+last updated, so results survive reruns and page changes until then.
+
+One worker serves a database at a time (an exclusive lock on `<db>.lock`);
+a second one started by another app process or a reload waits on standby
+until the lock is free. The worker runs as a child of the app (exits with
+it) or standalone:
+
+    python ims_jobs.py [--db ims_jobs.sqlite3] [--dir pdf_jobs] [--cache pdf_cache]
+"""
+import argparse, json, os, sqlite3, subprocess, sys, threading, time, uuid
+
+QUEUED, RUNNING, DONE, ERROR = "queued", "running", "done", "error"
+
+
+class JobStore:
+    def __init__(self, path="ims_jobs.sqlite3", artifact_dir="pdf_jobs", ttl=24 * 3600):
+        self.path, self.artifact_dir, self.ttl = path, artifact_dir, ttl
+        os.makedirs(artifact_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, kind TEXT NOT NULL, label TEXT NOT NULL, owner TEXT,
+            status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT NOT NULL DEFAULT '',
+            params TEXT NOT NULL, artifact TEXT, filename TEXT, mime TEXT,
+            created REAL NOT NULL, updated REAL NOT NULL, worker INTEGER)""")
+        if "worker" not in {r[1] for r in self._conn.execute("PRAGMA table_info(jobs)")}:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN worker INTEGER")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _row(self, cur):
+        cols = [d[0] for d in cur.description]
+        return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    def submit(self, kind, params, label, owner=None):
+        job_id, now = uuid.uuid4().hex[:12], time.time()
+        with self._lock:
+            self._conn.execute("INSERT INTO jobs (id, kind, label, owner, status, params, created, updated) VALUES (?,?,?,?,?,?,?,?)",
+                               (job_id, kind, label, owner, QUEUED, json.dumps(params, ensure_ascii=False, default=str), now, now))
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            rows = self._row(self._conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)))
+        return rows[0] if rows else None
+
+    def recent(self, owner=None, limit=20):
+        """Newest first, without params."""
+        sql = "SELECT id, kind, label, owner, status, progress, message, artifact, filename, mime, created, updated FROM jobs"
+        args = ()
+        if owner is not None: sql, args = sql + " WHERE owner=?", (owner,)
+        with self._lock:
+            return self._row(self._conn.execute(sql + " ORDER BY created DESC LIMIT ?", args + (limit,)))
+
+    def claim(self):
+        """Oldest queued job, marked running by this pid (atomic across processes); None if the queue is empty."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._row(self._conn.execute("SELECT * FROM jobs WHERE status=? ORDER BY created LIMIT 1", (QUEUED,)))
+                if rows:
+                    self._conn.execute("UPDATE jobs SET status=?, updated=?, worker=? WHERE id=?",
+                                       (RUNNING, time.time(), os.getpid(), rows[0]["id"]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK"); raise
+        return rows[0] if rows else None
+
+    def _update(self, job_id, **cols):
+        cols["updated"] = time.time()
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {', '.join(f'{k}=?' for k in cols)} WHERE id=?", (*cols.values(), job_id))
+
+    def progress(self, job_id, frac, message=""):
+        self._update(job_id, progress=float(frac), message=message)
+
+    def finish(self, job_id, data, filename, mime):
+        path = os.path.join(self.artifact_dir, f"{job_id}_{filename}")
+        with open(path + ".tmp", "wb") as f: f.write(data)
+        os.replace(path + ".tmp", path)
+        self._update(job_id, status=DONE, progress=1.0, message="", artifact=path, filename=filename, mime=mime)
+
+    def fail(self, job_id, message):
+        self._update(job_id, status=ERROR, message=str(message))
+
+    def requeue_running(self):
+        """Jobs left running by another worker go back to the queue.
+
+        Only call this while holding the worker lock (`worker_lock`): no other
+        worker is alive then, so anything it left running is orphaned.
+        """
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status=?, progress=0, worker=NULL WHERE status=? AND (worker IS NULL OR worker != ?)",
+                               (QUEUED, RUNNING, os.getpid()))
+
+    def purge(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            old = self._conn.execute("SELECT id, artifact FROM jobs WHERE updated < ? AND status IN (?, ?)",
+                                     (cutoff, DONE, ERROR)).fetchall()
+            if old: self._conn.execute(f"DELETE FROM jobs WHERE id IN ({','.join('?' * len(old))})", [i for i, _ in old])
+        for _, path in old:
+            if path:
+                try: os.remove(path)
+                except FileNotFoundError: pass
+        return len(old)
+
+    def read_artifact(self, job):
+        with open(job["artifact"], "rb") as f: return f.read()
+
+
+# =========================
+# Worker
+# =========================
+def worker_lock(db_path):
+    """Open file holding the exclusive per-database worker lock, or None if another worker has it."""
+    f = open(db_path + ".lock", "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close(); return None
+    return f
+
+
+def _run_job(job, store, pool, cache):
+    import pandas as pd
+    import ims_pdf
+    p, job_id = json.loads(job["params"]), job["id"]
+    report = lambda d, t, what: store.progress(job_id, d / t if t else 1.0, f"{what} {d}/{t}")
+    if job["kind"] == "rows":
+        items = [(int(r), e) for r, e in p["items"]]
+        pdfs = ims_pdf.batch_row_pdfs(pool, p["cfg"], p["sheet_name"], items, cache=cache,
+                                      on_progress=lambda d, t: report(d, t, "Rendered"))
+        if p.get("output") == "merged":
+            return ims_pdf.merge_pdfs(pdfs), f"{p['sheet_name']}_{len(pdfs)}rows.pdf", "application/pdf"
+        return ims_pdf.zip_pdfs(p["sheet_name"], pdfs), f"{p['sheet_name']}_{len(pdfs)}rows.zip", "application/zip"
+    if job["kind"] == "table":
+        frame = pd.DataFrame(p["rows"], columns=p["columns"])
+        args = (p["cfg"], p["sheet_name"], frame, p["sigs"], p["orientation"], p["include_summary"])
+        key = ims_pdf.pdf_key("table", p["cfg"], p["sheet_name"], frame, p["sigs"], p["orientation"], p["include_summary"], p["engine"])
+        if p["engine"] == "fast":
+            render = lambda dt: ims_pdf.fast_table_pdf(*args, dt=dt)
+        elif p["engine"] == "html-chunked":
+            render = lambda dt: ims_pdf.parallel_table_pdf(pool, *args, chunk_rows=p.get("chunk_rows", 250), dt=dt,
+                                                           on_progress=lambda d, t: report(d, t, "Rendered chunk"))
+        else:
+            render = lambda dt: pool.submit(ims_pdf.table_pdf, *args, dt).result()
+        data = cache.fetch(key, render)[0] if cache is not None else render(None)
+        return data, f"{p['sheet_name']}_Table_{len(frame)}rows.pdf", "application/pdf"
+    raise ValueError(f"Unknown job kind: {job['kind']}")
+
+
+def run_worker(db_path="ims_jobs.sqlite3", artifact_dir="pdf_jobs", ttl=24 * 3600, cache_dir=None,
+               workers=None, poll=1.0, parent_pid=None):
+    """Claim and run jobs until the parent process (if given) goes away.
+
+    Waits on standby while another worker holds the lock for this database.
+    """
+    import ims_pdf
+    alive = lambda: parent_pid is None or os.getppid() == parent_pid
+    lock = worker_lock(db_path)
+    while lock is None:
+        if not alive(): return
+        time.sleep(5 * poll); lock = worker_lock(db_path)
+    store = JobStore(db_path, artifact_dir, ttl)
+    store.requeue_running()
+    cache = ims_pdf.PdfCache(disk_dir=cache_dir) if cache_dir else None
+    pool, last_purge = None, 0.0
+    while alive():
+        if time.time() - last_purge > 600:
+            store.purge(); last_purge = time.time()
+        job = store.claim()
+        if job is None:
+            time.sleep(poll); continue
+        try:
+            if pool is None: pool = ims_pdf.pdf_pool(workers)
+            store.finish(job["id"], *_run_job(job, store, pool, cache))
+        except Exception as e:
+            store.fail(job["id"], f"{type(e).__name__}: {e}")
+    if pool is not None: pool.shutdown(cancel_futures=True)
+    lock.close()
+
+
+def start_worker(db_path="ims_jobs.sqlite3", artifact_dir="pdf_jobs", ttl=24 * 3600, cache_dir=None, workers=None):
+    """Launch the worker as a child process that exits when this process does.
+
+    A plain subprocess rather than multiprocessing: a daemonic Process may not
+    own a process pool, and a non-daemonic one would be joined at interpreter exit.
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), "--db", db_path, "--dir", artifact_dir,
+           "--cache", cache_dir or "", "--ttl-hours", str(ttl / 3600), "--parent", str(os.getpid())]
+    if workers: cmd += ["--workers", str(workers)]
+    return subprocess.Popen(cmd, cwd=os.getcwd())
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run the IMS PDF export job worker.")
+    ap.add_argument("--db", default="ims_jobs.sqlite3")
+    ap.add_argument("--dir", default="pdf_jobs")
+    ap.add_argument("--cache", default="pdf_cache")
+    ap.add_argument("--ttl-hours", type=float, default=24)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--parent", type=int, default=None, help="exit when this pid is no longer our parent")
+    a = ap.parse_args()
+    run_worker(a.db, a.dir, int(a.ttl_hours * 3600), a.cache or None, a.workers, parent_pid=a.parent)
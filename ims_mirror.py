@@ -0,0 +1,338 @@
+"""Local SQLite mirror of the IMS spreadsheets.
+
+One table per worksheet, keyed by sheet row number (row 1 holds the headers),
+plus a `_sheets` catalogue recording the current headers, a version counter and
+the last sync time. `get_sheet_frame` in ims_app.py reads from here first; Google
+is only hit by the background sync and by writes.
+"""
+import hashlib, json, sqlite3, threading, time
+from collections import OrderedDict
+
+
+def _table_name(sheet_id, sheet_name):
+    return "ws_" + hashlib.sha1(f"{sheet_id}\0{sheet_name}".encode("utf-8")).hexdigest()[:20]
+
+
+def _pad(row, width):
+    row = ["" if v is None else str(v) for v in row]
+    return row + [""] * (width - len(row)) if len(row) < width else row
+
+
+class SheetMirror:
+    def __init__(self, path="ims_mirror.sqlite3"):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS _sheets (
+            sheet_id TEXT NOT NULL, sheet_name TEXT NOT NULL, tbl TEXT NOT NULL,
+            headers TEXT NOT NULL DEFAULT '[]', version INTEGER NOT NULL DEFAULT 0,
+            synced_at REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (sheet_id, sheet_name))""")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS _files (
+            sheet_id TEXT PRIMARY KEY, revision TEXT, probed_at REAL NOT NULL DEFAULT 0)""")
+
+    # ---- catalogue ----
+    def _meta(self, sheet_id, sheet_name):
+        return self._conn.execute(
+            "SELECT tbl, headers, version, synced_at FROM _sheets WHERE sheet_id=? AND sheet_name=?",
+            (sheet_id, sheet_name)).fetchone()
+
+    def _ensure(self, sheet_id, sheet_name):
+        meta = self._meta(sheet_id, sheet_name)
+        if meta: return meta[0]
+        tbl = _table_name(sheet_id, sheet_name)
+        self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{tbl}" (row_num INTEGER PRIMARY KEY, cells TEXT NOT NULL)')
+        self._conn.execute("INSERT INTO _sheets (sheet_id, sheet_name, tbl) VALUES (?,?,?)", (sheet_id, sheet_name, tbl))
+        return tbl
+
+    def _bump(self, sheet_id, sheet_name, **cols):
+        sets = ", ".join(["version = version + 1"] + [f"{k} = ?" for k in cols])
+        self._conn.execute(f"UPDATE _sheets SET {sets} WHERE sheet_id=? AND sheet_name=?",
+                           (*cols.values(), sheet_id, sheet_name))
+
+    def has(self, sheet_id, sheet_name):
+        with self._lock: return self._meta(sheet_id, sheet_name) is not None
+
+    def names(self, sheet_id):
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT sheet_name FROM _sheets WHERE sheet_id=?", (sheet_id,))]
+
+    def headers(self, sheet_id, sheet_name):
+        with self._lock:
+            meta = self._meta(sheet_id, sheet_name)
+            return json.loads(meta[1]) if meta else None
+
+    def version(self, sheet_id, sheet_name):
+        with self._lock:
+            meta = self._meta(sheet_id, sheet_name)
+            return meta[2] if meta else None
+
+    def synced_at(self, sheet_id, sheet_name):
+        with self._lock:
+            meta = self._meta(sheet_id, sheet_name)
+            return meta[3] if meta else None
+
+    def revision(self, sheet_id):
+        """Local change counter for a whole spreadsheet (what LocalBackend reports as its revision)."""
+        with self._lock:
+            n, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(version), 0) FROM _sheets WHERE sheet_id=?",
+                                          (sheet_id,)).fetchone()
+            return f"{n}:{total}"
+
+    def file_revision(self, sheet_id):
+        """Upstream revision recorded at the last full sync, or None."""
+        with self._lock:
+            hit = self._conn.execute("SELECT revision FROM _files WHERE sheet_id=?", (sheet_id,)).fetchone()
+            return hit[0] if hit else None
+
+    def set_file_revision(self, sheet_id, revision):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO _files (sheet_id, revision, probed_at) VALUES (?,?,?)",
+                               (sheet_id, revision, time.time()))
+
+    # ---- reads ----
+    def read(self, sheet_id, sheet_name):
+        """Full grid (header row first) like get_all_values(), or None if not mirrored."""
+        return self.read_versioned(sheet_id, sheet_name)[1]
+
+    def read_versioned(self, sheet_id, sheet_name):
+        """(version, grid) taken in one snapshot, or (None, None) if not mirrored."""
+        with self._lock:
+            meta = self._meta(sheet_id, sheet_name)
+            if not meta: return None, None
+            headers = json.loads(meta[1])
+            rows = self._conn.execute(f'SELECT row_num, cells FROM "{meta[0]}" ORDER BY row_num').fetchall()
+        if not headers and not rows: return meta[2], []
+        grid, expect = [headers], 2
+        for row_num, cells in rows:
+            grid.extend([] for _ in range(row_num - expect))  # keep blank rows so indexes match the sheet
+            grid.append(json.loads(cells)); expect = row_num + 1
+        return meta[2], grid
+
+    def row_count(self, sheet_id, sheet_name):
+        """Last used sheet row number (1 = headers only), or None if not mirrored."""
+        with self._lock:
+            meta = self._meta(sheet_id, sheet_name)
+            if not meta: return None
+            return self._conn.execute(f'SELECT MAX(row_num) FROM "{meta[0]}"').fetchone()[0] or 1
+
+    def read_rows(self, sheet_id, sheet_name, start_row, end_row):
+        """Sheet rows start_row..end_row inclusive (blank rows as []), read with one indexed range scan."""
+        with self._lock:
+            meta = self._meta(sheet_id, sheet_name)
+            if not meta: return None
+            hits = dict(self._conn.execute(
+                f'SELECT row_num, cells FROM "{meta[0]}" WHERE row_num BETWEEN ? AND ?', (start_row, end_row)))
+        return [json.loads(hits[n]) if n in hits else [] for n in range(start_row, end_row + 1)]
+
+    # ---- writes ----
+    def replace(self, sheet_id, sheet_name, values):
+        """Incremental sync: write only rows that differ from the mirrored copy.
+
+        Returns the number of changed rows (header change counts as one).
+        """
+        values = values or []
+        headers = list(values[0]) if values else []
+        with self._lock:
+            tbl = self._ensure(sheet_id, sheet_name)
+            meta = self._meta(sheet_id, sheet_name)
+            old = dict(self._conn.execute(f'SELECT row_num, cells FROM "{tbl}"'))
+            new = {i: json.dumps(row, ensure_ascii=False) for i, row in enumerate(values[1:], start=2) if any(row)}
+            upserts = [(n, c) for n, c in new.items() if old.get(n) != c]
+            deletes = [(n,) for n in old if n not in new]
+            header_changed = json.loads(meta[1]) != headers
+            changed = len(upserts) + len(deletes) + (1 if header_changed else 0)
+            self._conn.execute("BEGIN")
+            try:
+                if upserts: self._conn.executemany(f'INSERT OR REPLACE INTO "{tbl}" (row_num, cells) VALUES (?,?)', upserts)
+                if deletes: self._conn.executemany(f'DELETE FROM "{tbl}" WHERE row_num=?', deletes)
+                if changed:
+                    self._bump(sheet_id, sheet_name, headers=json.dumps(headers, ensure_ascii=False), synced_at=time.time())
+                else:
+                    self.touch(sheet_id, sheet_name)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK"); raise
+        return changed
+
+    def create(self, sheet_id, sheet_name, headers):
+        with self._lock:
+            if self.has(sheet_id, sheet_name): raise ValueError(f"Worksheet '{sheet_name}' already exists")
+            self._ensure(sheet_id, sheet_name)
+            self._bump(sheet_id, sheet_name, headers=json.dumps(list(headers), ensure_ascii=False), synced_at=time.time())
+
+    def append_rows(self, sheet_id, sheet_name, rows):
+        """Append after the last stored row; returns the sheet row number of the first one."""
+        with self._lock:
+            tbl = self._ensure(sheet_id, sheet_name)
+            last = self._conn.execute(f'SELECT MAX(row_num) FROM "{tbl}"').fetchone()[0] or 1
+            start = last + 1
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(f'INSERT INTO "{tbl}" (row_num, cells) VALUES (?,?)',
+                                       [(start + i, json.dumps(list(r), ensure_ascii=False)) for i, r in enumerate(rows)])
+                self._bump(sheet_id, sheet_name)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK"); raise
+        return start
+
+    def put_rows(self, sheet_id, sheet_name, start_row, rows):
+        """Patch rows at known sheet row numbers (after an append/update was committed upstream).
+
+        No-op for worksheets that are not mirrored; returns whether the patch was applied.
+        """
+        with self._lock:
+            meta = self._meta(sheet_id, sheet_name)
+            if not meta: return False
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(f'INSERT OR REPLACE INTO "{meta[0]}" (row_num, cells) VALUES (?,?)',
+                                       [(start_row + i, json.dumps(list(r), ensure_ascii=False)) for i, r in enumerate(rows)])
+                self._bump(sheet_id, sheet_name)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK"); raise
+        return True
+
+    def update_cells(self, sheet_id, sheet_name, cells, create=False):
+        """Write [(row_num, col, value), ...] (1-based, row 1 = headers) in one transaction.
+
+        No-op for worksheets that are not mirrored unless `create` (LocalBackend, where this is the
+        primary store); returns whether the write was applied.
+        """
+        with self._lock:
+            if not create and not self._meta(sheet_id, sheet_name): return False
+            tbl = self._ensure(sheet_id, sheet_name)
+            headers = json.loads(self._meta(sheet_id, sheet_name)[1])
+            by_row = {}
+            for r, c, v in cells: by_row.setdefault(r, []).append((c, "" if v is None else str(v)))
+            self._conn.execute("BEGIN")
+            try:
+                for r, items in by_row.items():
+                    if r == 1:
+                        row = headers
+                    else:
+                        hit = self._conn.execute(f'SELECT cells FROM "{tbl}" WHERE row_num=?', (r,)).fetchone()
+                        row = json.loads(hit[0]) if hit else []
+                    row = _pad(row, max(c for c, _ in items))
+                    for c, v in items: row[c - 1] = v
+                    if r == 1:
+                        headers = row
+                    else:
+                        self._conn.execute(f'INSERT OR REPLACE INTO "{tbl}" (row_num, cells) VALUES (?,?)',
+                                           (r, json.dumps(row, ensure_ascii=False)))
+                self._bump(sheet_id, sheet_name, headers=json.dumps(headers, ensure_ascii=False))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK"); raise
+        return True
+
+    def rename(self, sheet_id, old_name, new_name):
+        with self._lock:
+            self._conn.execute("UPDATE _sheets SET sheet_name=?, version=version+1 WHERE sheet_id=? AND sheet_name=?",
+                               (new_name, sheet_id, old_name))
+
+    def touch(self, sheet_id, sheet_name):
+        with self._lock:
+            self._conn.execute("UPDATE _sheets SET synced_at=? WHERE sheet_id=? AND sheet_name=?",
+                               (time.time(), sheet_id, sheet_name))
+
+    def touch_all(self, sheet_id):
+        with self._lock:
+            self._conn.execute("UPDATE _sheets SET synced_at=? WHERE sheet_id=?", (time.time(), sheet_id))
+
+    def forget(self, sheet_id, sheet_name):
+        with self._lock:
+            meta = self._meta(sheet_id, sheet_name)
+            if not meta: return
+            self._conn.execute(f'DROP TABLE IF EXISTS "{meta[0]}"')
+            self._conn.execute("DELETE FROM _sheets WHERE sheet_id=? AND sheet_name=?", (sheet_id, sheet_name))
+
+    def close(self):
+        with self._lock: self._conn.close()
+
+
+class TTLCache:
+    """Thread-safe LRU with a TTL (Google page windows, built DataFrames)."""
+
+    def __init__(self, maxsize=64, ttl=120):
+        self.maxsize, self.ttl = maxsize, ttl
+        self._items, self._lock = OrderedDict(), threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is None: return None
+            if time.monotonic() - hit[0] > self.ttl:
+                del self._items[key]; return None
+            self._items.move_to_end(key)
+            return hit[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic(), value); self._items.move_to_end(key)
+            while len(self._items) > self.maxsize: self._items.popitem(last=False)
+
+    def discard_where(self, pred):
+        with self._lock:
+            for key in [k for k in self._items if pred(k)]: del self._items[key]
+
+
+class MirrorSync:
+    """Background thread that refreshes the mirror from Google on an interval.
+
+    `fetch_spreadsheet(sheet_id)` must return {worksheet_name: all_values}.
+    Worksheets that disappeared from the spreadsheet are dropped from the mirror.
+    With `probe(sheet_id)` (e.g. the Drive modifiedTime) a spreadsheet whose revision
+    matches the last full sync is not downloaded again; its sheets are just re-stamped.
+    """
+
+    def __init__(self, mirror, sheet_ids, fetch_spreadsheet, interval=300, on_error=None, probe=None):
+        self.mirror, self.sheet_ids = mirror, list(sheet_ids)
+        self.fetch_spreadsheet, self.interval, self.on_error = fetch_spreadsheet, interval, on_error
+        self.probe = probe
+        self.last_run, self.last_error = 0.0, None
+        self.stats = {"probes": 0, "skipped": 0, "fetched": 0}
+        self._wake, self._stop = threading.Event(), threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ims-mirror-sync", daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive(): self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set(); self._wake.set()
+
+    def request_sync(self):
+        self._wake.set()
+
+    def sync_once(self):
+        for sheet_id in self.sheet_ids:
+            try:
+                self._sync_sheet(sheet_id)
+            except Exception as e:  # probe, fetch or a local write (e.g. "database is locked")
+                self.last_error = e
+                if self.on_error: self.on_error(sheet_id, e)
+        self.last_run = time.time()
+
+    def _sync_sheet(self, sheet_id):
+        revision = None
+        if self.probe:
+            revision = self.probe(sheet_id); self.stats["probes"] += 1
+            if revision is not None and revision == self.mirror.file_revision(sheet_id):
+                self.mirror.touch_all(sheet_id); self.stats["skipped"] += 1
+                return
+        data = self.fetch_spreadsheet(sheet_id); self.stats["fetched"] += 1
+        for name, values in data.items():
+            self.mirror.replace(sheet_id, name, values)
+        for name in set(self.mirror.names(sheet_id)) - set(data):
+            self.mirror.forget(sheet_id, name)
+        if revision is not None: self.mirror.set_file_revision(sheet_id, revision)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sync_once()
+            self._wake.wait(self.interval); self._wake.clear()
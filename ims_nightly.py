@@ -0,0 +1,148 @@
+"""Headless pre-generation of the standard register PDFs.
+
+For every configured form in both spreadsheets this renders the full table
+export (all rows, every config field and signature present in the sheet,
+landscape, with the signature summary) using the same templates/engine as the
+PDF Export section, and files it under a dated archive:
+
+    pdf_archive/2026-01-31/LW FILES/LW4 10.pdf
+    pdf_archive/manifest.json      # latest file + content key per form
+
+A form is skipped when its content key (template version + config + data) is
+unchanged since the last run, so quiet registers cost one read and no render.
+Data comes from Google (batched, through the shared quota bucket) or, with
+--from-mirror, straight from the app's SQLite mirror with no API calls.
+
+    python ims_nightly.py                 # run once (e.g. from cron at 02:00)
+    python ims_nightly.py --at 02:00      # stay resident and run every night
+"""
+import argparse, json, os, time, traceback
+from datetime import datetime, timedelta
+
+from ims_backend import SHEET_IDS, open_backend, read_all_worksheets
+from ims_frames import frame_from_grid
+from ims_mirror import SheetMirror
+from ims_pdf import fast_table_pdf, pdf_key, pdf_pool
+from ims_schema import ConfigRegistry
+
+ARCHIVE_DIR = "pdf_archive"
+MANIFEST = "manifest.json"
+ORIENTATION = "Landscape"
+CONFIGS = ConfigRegistry()  # with --at, edited config files are picked up on the next run
+
+
+def _safe(name):
+    return "".join(ch if ch.isalnum() or ch in " -_.&" else "_" for ch in name).strip()
+
+
+def load_manifest(archive_dir=ARCHIVE_DIR):
+    try:
+        with open(os.path.join(archive_dir, MANIFEST), encoding="utf-8") as f: return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+_manifest_cache = {}  # manifest path -> (mtime_ns, manifest), read-only copies for archived_pdf
+
+
+def _latest_manifest(archive_dir):
+    path = os.path.join(archive_dir, MANIFEST)
+    try: mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError: return {}
+    hit = _manifest_cache.get(path)
+    if hit is None or hit[0] != mtime:
+        hit = _manifest_cache[path] = (mtime, load_manifest(archive_dir))
+    return hit[1]
+
+
+def _save_manifest(archive_dir, manifest):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f: json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def archived_pdf(sheet_type, sheet_name, archive_dir=ARCHIVE_DIR):
+    """Manifest entry {"path", "generated_at", "rows", ...} for the latest archived PDF, if its file still exists."""
+    entry = _latest_manifest(archive_dir).get(sheet_type, {}).get(sheet_name)
+    return entry if entry and os.path.isfile(entry["path"]) else None
+
+
+def standard_table(cfg, values):
+    """(frame, signature columns) for the standard export: config fields then signatures, as present in the sheet."""
+    frame = frame_from_grid(values, cfg, typed=False)
+    sigs = [c for c in frame.columns if c in cfg.signatures]
+    cols = [c for c in frame.columns if c in cfg.fields] + sigs
+    return frame[cols], sigs
+
+
+def read_sheets(sheet_type, from_mirror=None):
+    sheet_id = SHEET_IDS[sheet_type]
+    if from_mirror:
+        mirror = SheetMirror(from_mirror)
+        return {n: mirror.read(sheet_id, n) or [] for n in mirror.names(sheet_id)}
+    return read_all_worksheets(open_backend(sheet_id))
+
+
+def run(archive_dir=ARCHIVE_DIR, from_mirror=None, workers=None, force=False, log=print):
+    """One pass over every configured form; returns {"rendered": n, "skipped": n, "failed": n}."""
+    day_dir = os.path.join(archive_dir, datetime.now().strftime("%Y-%m-%d"))
+    manifest, counts = load_manifest(archive_dir), {"rendered": 0, "skipped": 0, "failed": 0}
+    with pdf_pool(workers) as pool:
+        for sheet_type in SHEET_IDS:
+            try:  # a quota error, network blip or bad config fails this sheet type, not the night
+                configs, data = CONFIGS.get(sheet_type), read_sheets(sheet_type, from_mirror)
+            except Exception as e:
+                counts["failed"] += 1; log(f"[{sheet_type}] FAILED {e}"); continue
+            done, futs = manifest.setdefault(sheet_type, {}), {}
+            for name, cfg in configs.items():
+                values = data.get(name)
+                if not values: continue
+                try:
+                    frame, sigs = standard_table(cfg, values)
+                    if frame.empty or not len(frame.columns): continue
+                    key = pdf_key("table", cfg, name, frame, sigs, ORIENTATION, True, "fast")
+                except Exception as e:
+                    counts["failed"] += 1; log(f"[{sheet_type}] {name}: FAILED {e}"); continue
+                prev = done.get(name)
+                if not force and prev and prev["key"] == key and os.path.isfile(prev["path"]):
+                    counts["skipped"] += 1; continue
+                futs[name] = (key, len(frame), pool.submit(fast_table_pdf, cfg, name, frame, sigs, ORIENTATION, True))
+            for name, (key, n_rows, fut) in futs.items():
+                path = os.path.join(day_dir, _safe(sheet_type), f"{_safe(name)}.pdf")
+                try:
+                    data_pdf = fut.result()
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, "wb") as f: f.write(data_pdf)
+                except Exception as e:
+                    counts["failed"] += 1; log(f"[{sheet_type}] {name}: FAILED {e}"); continue
+                done[name] = {"key": key, "path": path, "rows": n_rows, "generated_at": time.time()}
+                counts["rendered"] += 1; log(f"[{sheet_type}] {name}: {n_rows} rows -> {path}")
+            _save_manifest(archive_dir, manifest)
+    return counts
+
+
+def _seconds_until(hhmm):
+    h, m = map(int, hhmm.split(":"))
+    now = datetime.now()
+    nxt = now.replace(hour=h, minute=m, second=0, microsecond=0)
+    if nxt <= now: nxt += timedelta(days=1)
+    return (nxt - now).total_seconds()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Pre-render the standard table PDF for every configured form.")
+    ap.add_argument("--archive", default=ARCHIVE_DIR)
+    ap.add_argument("--from-mirror", metavar="SQLITE", help="read the app's mirror file instead of calling Google")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--force", action="store_true", help="re-render even when the data is unchanged")
+    ap.add_argument("--at", metavar="HH:MM", help="stay resident and run every day at this time")
+    a = ap.parse_args()
+    while True:
+        if a.at: time.sleep(_seconds_until(a.at))
+        try:
+            print(run(a.archive, a.from_mirror, a.workers, a.force))
+        except Exception:
+            if not a.at: raise
+            traceback.print_exc()  # e.g. the archive disk is full; the resident scheduler tries again tomorrow
+        if not a.at: break
@@ -0,0 +1,436 @@
+"""PDF rendering for the PDF Export section.
+
+Templates live in templates/ and are compiled once per process by a shared
+jinja2 Environment (with an on-disk bytecode cache so new processes skip the
+parse step too). Stylesheets and any other assets a template references are
+read once and kept in memory: CSS is inlined through the `css()` template
+global, and `link_callback` serves fonts/images from memory as data URIs so
+xhtml2pdf never resolves paths per document.
+
+xhtml2pdf is pure Python and holds the GIL, so batches of row PDFs are rendered
+on a process pool (`batch_row_pdfs`) and packed into a ZIP or one merged PDF;
+large tables can be split into row chunks the same way (`parallel_table_pdf`,
+opt-in: every chunk starts a new page).
+
+`PdfCache` keeps finished PDFs under a content hash (template sources, config
+and the exact rows/columns/options printed): an LRU in memory backed by a
+directory on disk. The "Generated" stamp is the time the cached copy was
+rendered, so it is part of the entry (a header line in the disk file) rather
+than the key.
+
+`fast_table_pdf` draws the same table export straight from the DataFrame with
+ReportLab flowables (ReportLab ships with xhtml2pdf), skipping HTML/CSS layout.
+"""
+import base64, contextlib, functools, hashlib, json, mimetypes, multiprocessing, os, tempfile, threading, time, zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+from xhtml2pdf import pisa
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+BYTECODE_DIR = os.path.join(tempfile.gettempdir(), "ims_jinja_cache")
+
+
+class PdfError(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def _asset_text(name):
+    with open(os.path.join(TEMPLATE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def _asset_uri(path):
+    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    with open(path, "rb") as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode('ascii')}"
+
+
+def link_callback(uri, rel):
+    """Relative asset references (fonts, images) resolve to cached data URIs from templates/."""
+    if "://" in uri or uri.startswith("data:"): return uri
+    path = os.path.normpath(os.path.join(TEMPLATE_DIR, uri))
+    if os.path.commonpath([path, TEMPLATE_DIR]) != TEMPLATE_DIR or not os.path.isfile(path): return uri
+    return _asset_uri(path)
+
+
+@functools.lru_cache(maxsize=1)
+def environment():
+    os.makedirs(BYTECODE_DIR, exist_ok=True)
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(["html"]),
+                      bytecode_cache=FileSystemBytecodeCache(BYTECODE_DIR), auto_reload=False)
+    env.globals["css"] = lambda name: Markup(_asset_text(name))
+    return env
+
+
+def render(template, **ctx):
+    return environment().get_template(template).render(**ctx)
+
+
+def html_to_pdf(html):
+    out = BytesIO()
+    status = pisa.CreatePDF(BytesIO(html.encode("utf-8")), dest=out, encoding="utf-8", link_callback=link_callback)
+    if status.err: raise PdfError(f"PDF generation error: {status.err}")
+    return out.getvalue()
+
+
+def _now(ts=None):
+    return datetime.fromtimestamp(ts or time.time()).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# =========================
+# Documents
+# =========================
+def row_html(cfg, sheet_name, rownum, entry, dt=None):
+    return render("row.html",
+                  title=cfg.get("title", sheet_name), row=rownum, dt=dt or _now(),
+                  form_data={f: entry.get(f, "") for f in cfg.get("fields", [])},
+                  signatures={s: entry.get(s, "❌ No") for s in cfg.get("signatures", [])})
+
+
+def signature_summary(frame, sigs):
+    summary, total = {}, len(frame)
+    for s in sigs:
+        if s not in frame.columns: continue
+        text = frame[s].astype(str)
+        s_yes = text.str.contains('✔️|Yes', case=False, na=False).sum()
+        s_no = text.str.contains('❌|No', case=False, na=False).sum()
+        summary[s] = {"signed": s_yes, "not_signed": s_no, "pct": (s_yes/total*100) if total else 0}
+    return summary
+
+
+def _table_context(cfg, sheet_name, frame, sigs, orientation, include_summary, dt):
+    cols = list(frame.columns)
+    return dict(title=cfg.get("title", sheet_name), dt=dt or _now(),
+                n=len(frame), m=len(cols), cols=cols, sigs=sigs,
+                include_summary=include_summary, summary=signature_summary(frame, sigs) if include_summary else {},
+                orientation=orientation)
+
+
+def table_html(cfg, sheet_name, frame, sigs, orientation="Landscape", include_summary=True, dt=None):
+    """frame holds just the rows and columns to print, in order."""
+    ctx = _table_context(cfg, sheet_name, frame, sigs, orientation, include_summary, dt)
+    return render("table.html", data=frame.to_dict(orient="records"), show_header=True, **ctx)
+
+
+def _cell_state(text):
+    if '✔️' in text or text.lower() == 'yes': return "signed"
+    if '❌' in text or text.lower() == 'no': return "not-signed"
+    return None
+
+
+def fast_table_pdf(cfg, sheet_name, frame, sigs, orientation="Landscape", include_summary=True, dt=None):
+    """table_pdf without xhtml2pdf: same header block, summary and signed/not-signed cell colours."""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A4, landscape, portrait
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    from xml.sax.saxutils import escape
+
+    ctx = _table_context(cfg, sheet_name, frame, sigs, orientation, include_summary, dt)
+    pagesize = landscape(A4) if orientation == "Landscape" else portrait(A4)
+    out = BytesIO()
+    doc = SimpleDocTemplate(out, pagesize=pagesize, leftMargin=0.5*inch, rightMargin=0.5*inch,
+                            topMargin=0.5*inch, bottomMargin=0.5*inch, title=f"{ctx['title']} - Table Export")
+    title = ParagraphStyle("t", fontName="Helvetica-Bold", fontSize=18, leading=22, alignment=TA_CENTER)
+    sub = ParagraphStyle("s", fontName="Helvetica", fontSize=10, leading=13, alignment=TA_CENTER, textColor=colors.HexColor("#333333"))
+    cell = ParagraphStyle("c", fontName="Helvetica", fontSize=8, leading=10)
+    head = ParagraphStyle("h", parent=cell, fontName="Helvetica-Bold", fontSize=9, leading=11, textColor=colors.white)
+
+    story = [Paragraph(escape(f"{ctx['title']} - Table Export"), title),
+             Paragraph(escape(f"Generated {ctx['dt']} • Records: {ctx['n']} • Columns: {ctx['m']}"), sub), Spacer(1, 8)]
+    if include_summary and ctx["summary"]:
+        lines = ["<b>Signature Summary</b>"] + [escape(f"{k}: ✔️ {v['signed']} ({v['pct']:.1f}%) • ❌ {v['not_signed']}")
+                                                for k, v in ctx["summary"].items()]
+        box = Table([[Paragraph("<br/>".join(lines), ParagraphStyle("sum", parent=cell, fontSize=10, leading=13))]],
+                    colWidths=[doc.width])
+        box.setStyle(TableStyle([("BACKGROUND", (0, 0), (-1, -1), colors.HexColor("#f8f9fa")),
+                                 ("BOX", (0, 0), (-1, -1), 0.75, colors.HexColor("#dee2e6")),
+                                 ("PADDING", (0, 0), (-1, -1), 8)]))
+        story += [box, Spacer(1, 6)]
+
+    cols = ctx["cols"]
+    col_w = doc.width / max(len(cols), 1)
+    fits = max(int((col_w - 8) / (8 * 0.5)), 1)  # chars that fit on one line at 8pt Helvetica (approx.)
+    sig_idx = {i for i, c in enumerate(cols) if c in sigs}
+    styles = [("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#343a40")),
+              ("GRID", (0, 0), (-1, 0), 0.5, colors.HexColor("#495057")),
+              ("GRID", (0, 1), (-1, -1), 0.5, colors.HexColor("#dee2e6")),
+              ("FONT", (0, 1), (-1, -1), "Helvetica", 8),
+              ("VALIGN", (0, 0), (-1, -1), "TOP"),
+              ("TOPPADDING", (0, 0), (-1, -1), 6), ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+              ("LEFTPADDING", (0, 0), (-1, -1), 4), ("RIGHTPADDING", (0, 0), (-1, -1), 4)]
+    signed_bg, signed_fg = colors.HexColor("#d4edda"), colors.HexColor("#155724")
+    unsigned_bg, unsigned_fg = colors.HexColor("#f8d7da"), colors.HexColor("#721c24")
+    data = [[Paragraph(escape(str(c)), head) for c in cols]]
+    columns = [frame.iloc[:, i].astype(str).tolist() for i in range(len(cols))]
+    for r, values in enumerate(zip(*columns), start=1):
+        row = []
+        for i, v in enumerate(values):
+            text = v if v and v not in ("nan", "None") else "-"
+            row.append(Paragraph(escape(text), cell) if len(text) > fits else text)
+            if i in sig_idx:
+                state = _cell_state(text)
+                if state == "signed":
+                    styles += [("BACKGROUND", (i, r), (i, r), signed_bg), ("TEXTCOLOR", (i, r), (i, r), signed_fg),
+                               ("FONT", (i, r), (i, r), "Helvetica-Bold", 8), ("ALIGN", (i, r), (i, r), "CENTER")]
+                elif state == "not-signed":
+                    styles += [("BACKGROUND", (i, r), (i, r), unsigned_bg), ("TEXTCOLOR", (i, r), (i, r), unsigned_fg),
+                               ("ALIGN", (i, r), (i, r), "CENTER")]
+        data.append(row)
+    table = LongTable(data, colWidths=[col_w] * len(cols), repeatRows=1)
+    table.setStyle(TableStyle(styles))
+    story.append(table)
+    doc.build(story)
+    return out.getvalue()
+
+
+def row_pdf(cfg, sheet_name, rownum, entry, dt=None):
+    return html_to_pdf(row_html(cfg, sheet_name, rownum, entry, dt))
+
+
+def table_pdf(cfg, sheet_name, frame, sigs, orientation="Landscape", include_summary=True, dt=None):
+    return html_to_pdf(table_html(cfg, sheet_name, frame, sigs, orientation, include_summary, dt))
+
+
+# =========================
+# Batches (process pool)
+# =========================
+def pdf_pool(workers=None):
+    """Spawned workers: the parent is a threaded server, so forking it is unsafe."""
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+
+
+def _render_chunk(cfg, sheet_name, items, dt):
+    return [(rownum, row_pdf(cfg, sheet_name, rownum, entry, dt)) for rownum, entry in items]
+
+
+def batch_row_pdfs(pool, cfg, sheet_name, items, chunk=8, on_progress=None, cache=None):
+    """items: [(rownum, entry)] -> [(rownum, pdf bytes)] in the same order.
+
+    Rows already in `cache` (a PdfCache) are reused; the rest go to the pool
+    `chunk` at a time to keep pickling overhead small. on_progress(done, total)
+    is called as chunks finish.
+    """
+    ts, out, keys = time.time(), {}, {}
+    if cache is not None:
+        for rownum, entry in items:
+            keys[rownum] = pdf_key("row", cfg, sheet_name, rownum, entry)
+            hit = cache.get(keys[rownum])
+            if hit is not None: out[rownum] = hit[0]
+    todo = [(r, e) for r, e in items if r not in out]
+    futs = [pool.submit(_render_chunk, cfg, sheet_name, todo[i:i+chunk], _now(ts)) for i in range(0, len(todo), chunk)]
+    if on_progress: on_progress(len(out), len(items))
+    for fut in as_completed(futs):
+        for rownum, data in fut.result():
+            out[rownum] = data
+            if cache is not None: cache.put(keys[rownum], data, ts)
+        if on_progress: on_progress(len(out), len(items))
+    return [(rownum, out[rownum]) for rownum, _ in items]
+
+
+def _render_table_chunk(ctx, data, show_header):
+    return html_to_pdf(render("table.html", data=data, show_header=show_header, **ctx))
+
+
+def parallel_table_pdf(pool, cfg, sheet_name, frame, sigs, orientation="Landscape", include_summary=True,
+                       chunk_rows=250, max_in_flight=8, on_progress=None, dt=None):
+    """table_pdf for large frames: `chunk_rows`-row slices render in the pool and are stitched in order.
+
+    The title block and signature summary (computed once, here) go on the first
+    chunk; the column header repeats on every page. At most `max_in_flight`
+    slices are pickled and queued at a time, which keeps memory bounded.
+
+    Layout differs from table_pdf: each slice is its own document, so every
+    slice starts on a new page and the last page of a slice is usually part
+    empty. Row heights vary with wrapped text, so no chunk size lines up with
+    page breaks in general; callers offer this as an opt-in ("html-chunked").
+    """
+    if len(frame) <= chunk_rows:
+        return table_pdf(cfg, sheet_name, frame, sigs, orientation, include_summary, dt)
+    ctx = _table_context(cfg, sheet_name, frame, sigs, orientation, include_summary, dt)
+    starts, parts, pending = list(range(0, len(frame), chunk_rows)), {}, {}
+    nxt = 0
+    while nxt < len(starts) or pending:
+        while nxt < len(starts) and len(pending) < max_in_flight:
+            i = starts[nxt]
+            pending[pool.submit(_render_table_chunk, ctx, frame.iloc[i:i+chunk_rows].to_dict(orient="records"), i == 0)] = nxt
+            nxt += 1
+        fut = next(as_completed(pending))
+        parts[pending.pop(fut)] = fut.result()
+        if on_progress: on_progress(len(parts), len(starts))
+    return _concat([parts[k] for k in range(len(starts))])
+
+
+def _concat(parts, titles=None):
+    from pypdf import PdfReader, PdfWriter  # installed with xhtml2pdf
+    writer, out = PdfWriter(), BytesIO()
+    for i, data in enumerate(parts):
+        writer.append(PdfReader(BytesIO(data)), outline_item=titles[i] if titles else None)
+    writer.write(out)
+    return out.getvalue()
+
+
+def zip_pdfs(sheet_name, pdfs):
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for rownum, data in pdfs: zf.writestr(f"{sheet_name}_Row_{rownum}.pdf", data)
+    return buf.getvalue()
+
+
+def merge_pdfs(pdfs):
+    """One PDF with a bookmark per row."""
+    return _concat([data for _, data in pdfs], [f"Row {rownum}" for rownum, _ in pdfs])
+
+
+# =========================
+# Result cache
+# =========================
+@functools.lru_cache(maxsize=1)
+def template_version():
+    """Hash of every file in templates/; bumps when a template or stylesheet changes."""
+    h = hashlib.sha256()
+    for name in sorted(os.listdir(TEMPLATE_DIR)):
+        path = os.path.join(TEMPLATE_DIR, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f: h.update(name.encode() + b"\0" + f.read())
+    return h.hexdigest()[:16]
+
+
+def _frame_digest(frame):
+    h = hashlib.sha256(json.dumps([str(c) for c in frame.columns]).encode())
+    h.update(pd.util.hash_pandas_object(frame.astype(str), index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def pdf_key(kind, cfg, *parts):
+    """Content address for one document; DataFrames are hashed by value."""
+    norm = [_frame_digest(p) if isinstance(p, pd.DataFrame) else p for p in parts]
+    blob = json.dumps([template_version(), kind, cfg, norm], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    """LRU of finished PDFs (bounded by total bytes) with an optional on-disk tier.
+
+    Entries are (pdf bytes, generated_at epoch seconds). On disk each file
+    starts with a one-line header holding generated_at, and its mtime is the
+    last time it was used: hits touch it, and pruning drops the least recently
+    used files once a running size total passes `disk_max_bytes`. Concurrent
+    `fetch`es of the same key render once.
+    """
+    HEADER = b"IMSPDF "
+
+    def __init__(self, max_bytes=64 << 20, disk_dir=None, disk_max_bytes=512 << 20):
+        self.max_bytes, self.disk_dir, self.disk_max_bytes = max_bytes, disk_dir, disk_max_bytes
+        self._items, self._size, self._lock = OrderedDict(), 0, threading.Lock()
+        self._inflight = {}  # key -> [lock, waiters]
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        self._disk_size = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_size = sum(e.stat().st_size for e in self._disk_files())
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pdf")
+
+    def _disk_files(self):
+        return [e for e in os.scandir(self.disk_dir) if e.name.endswith(".pdf")]
+
+    def _remember(self, key, entry):
+        old = self._items.pop(key, None)
+        if old: self._size -= len(old[0])
+        self._items[key] = entry; self._size += len(entry[0])
+        while self._size > self.max_bytes and len(self._items) > 1:
+            _, (data, _) = self._items.popitem(last=False); self._size -= len(data)
+
+    def _read_disk(self, path):
+        with open(path, "rb") as f: blob = f.read()
+        if blob.startswith(self.HEADER):
+            line, _, data = blob.partition(b"\n")
+            return data, float(line[len(self.HEADER):])
+        return blob, os.path.getmtime(path)  # written before the header existed
+
+    def _get(self, key, count=True):
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is not None:
+                self._items.move_to_end(key)
+                if count: self.stats["hits"] += 1
+                return hit
+        if self.disk_dir:
+            try:
+                path = self._path(key)
+                entry = self._read_disk(path)
+                os.utime(path)  # mtime = last use, for LRU pruning
+                with self._lock:
+                    self._remember(key, entry)
+                    if count: self.stats["disk_hits"] += 1
+                return entry
+            except FileNotFoundError:
+                pass
+        if count:
+            with self._lock: self.stats["misses"] += 1
+        return None
+
+    def get(self, key):
+        return self._get(key)
+
+    def put(self, key, data, generated_at):
+        with self._lock: self._remember(key, (data, generated_at))
+        if not self.disk_dir: return
+        path = self._path(key)
+        try: replaced = os.path.getsize(path)
+        except FileNotFoundError: replaced = 0
+        blob = self.HEADER + repr(float(generated_at)).encode() + b"\n" + data
+        with open(path + ".tmp", "wb") as f: f.write(blob)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            self._disk_size += len(blob) - replaced
+            over = self._disk_size > self.disk_max_bytes
+        if over: self._prune_disk()
+
+    def _prune_disk(self):
+        """Drop least recently used files until under the limit; also resyncs the running total."""
+        files = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in self._disk_files()))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.disk_max_bytes: break
+            try: os.remove(path)
+            except FileNotFoundError: pass
+            total -= size
+        with self._lock: self._disk_size = total
+
+    @contextlib.contextmanager
+    def _single_flight(self, key):
+        with self._lock:
+            slot = self._inflight.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]: yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if not slot[1]: self._inflight.pop(key, None)
+
+    def fetch(self, key, render):
+        """(pdf bytes, generated_at, from_cache); on a miss render(dt) gets the "Generated" stamp to print."""
+        hit = self.get(key)
+        if hit is not None: return hit[0], hit[1], True
+        with self._single_flight(key):
+            hit = self._get(key, count=False)  # rendered by a concurrent caller meanwhile
+            if hit is not None: return hit[0], hit[1], True
+            ts = time.time()
+            data = render(_now(ts))
+            self.put(key, data, ts)
+            return data, ts, False
@@ -0,0 +1,119 @@
+"""Process-wide (optionally cross-process) token bucket for Google API calls.
+
+One bucket covers the whole Google project: both spreadsheets, every Streamlit
+session, the background threads and the admin scripts. With `state_path` set the
+bucket state lives in a small SQLite file so separate processes share it.
+
+Interactive calls may use every token; background work (mirror sync, warm-up)
+only takes a token while more than `background_reserve` of the bucket is left,
+so user-facing reads and writes are never starved by refreshes.
+"""
+import contextlib, json, sqlite3, threading, time
+
+INTERACTIVE, BACKGROUND = 0, 1
+
+
+class _MemoryState:
+    def __init__(self, initial):
+        self._lock, self._state = threading.Lock(), initial
+
+    def transact(self, fn):
+        with self._lock:
+            return fn(self._state)
+
+
+class _SQLiteState:
+    def __init__(self, path, initial):
+        self.path, self._lock = path, threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bucket (id INTEGER PRIMARY KEY CHECK (id = 1), state TEXT NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO bucket (id, state) VALUES (1, ?)", (json.dumps(initial),))
+
+    def transact(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")  # serialises against other processes
+            try:
+                state = json.loads(self._conn.execute("SELECT state FROM bucket WHERE id = 1").fetchone()[0])
+                result = fn(state)
+                self._conn.execute("UPDATE bucket SET state = ? WHERE id = 1", (json.dumps(state),))
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK"); raise
+
+
+class TokenBucket:
+    def __init__(self, capacity=40, period=60.0, background_reserve=0.25, state_path=None):
+        self.capacity, self.period = capacity, float(period)
+        self.rate = capacity / self.period
+        self.reserve = capacity * background_reserve
+        initial = {"tokens": float(capacity), "ts": time.time(), "calls": []}
+        self._store = _SQLiteState(state_path, initial) if state_path else _MemoryState(initial)
+        self._local = threading.local()
+
+    # ---- priority scope ----
+    @contextlib.contextmanager
+    def priority(self, priority):
+        """Calls made by this thread inside the block default to `priority`."""
+        prev = getattr(self._local, "priority", INTERACTIVE)
+        self._local.priority = priority
+        try: yield
+        finally: self._local.priority = prev
+
+    def _priority(self, priority):
+        return getattr(self._local, "priority", INTERACTIVE) if priority is None else priority
+
+    # ---- state ----
+    def _refill(self, state, now):
+        state["tokens"] = min(self.capacity, state["tokens"] + (now - state["ts"]) * self.rate)
+        state["ts"] = now
+        state["calls"] = [t for t in state["calls"] if now - t < self.period]
+
+    def _floor(self, priority):
+        return self.reserve if priority == BACKGROUND else 0.0
+
+    def try_acquire(self, n=1, priority=None):
+        """Take `n` tokens if available right now; returns (ok, seconds_to_wait)."""
+        floor = self._floor(self._priority(priority))
+        def op(state):
+            now = time.time(); self._refill(state, now)
+            if state["tokens"] - n >= floor:
+                state["tokens"] -= n; state["calls"].extend([now] * n)
+                return True, 0.0
+            return False, (n + floor - state["tokens"]) / self.rate
+        return self._store.transact(op)
+
+    def acquire(self, n=1, priority=None, timeout=None):
+        """Block until `n` tokens are available (for worker threads and scripts)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            ok, wait = self.try_acquire(n, priority)
+            if ok: return True
+            if deadline is not None and time.monotonic() + wait > deadline: return False
+            time.sleep(min(wait, 5.0))
+
+    def wait_time(self, n=1, priority=None):
+        """Seconds until `n` tokens would be available at this priority (0 if now)."""
+        floor = self._floor(self._priority(priority))
+        def op(state):
+            self._refill(state, time.time())
+            return max(0.0, (n + floor - state["tokens"]) / self.rate)
+        return self._store.transact(op)
+
+    def usage(self):
+        """Calls recorded in the last `period` seconds, across everything sharing the bucket."""
+        def op(state):
+            self._refill(state, time.time())
+            return len(state["calls"])
+        return self._store.transact(op)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_bucket(state_path="ims_quota.sqlite3", capacity=40, period=60.0):
+    """One bucket per state file per process (the file itself is shared between processes)."""
+    with _shared_lock:
+        if state_path not in _shared:
+            _shared[state_path] = TokenBucket(capacity, period, state_path=state_path)
+        return _shared[state_path]
@@ -0,0 +1,142 @@
+"""Executor-backed scheduler for Google API calls.
+
+Calls run on a small thread pool instead of the Streamlit script thread, so
+quota waits and 429 backoff sleep there rather than freezing the page. `submit`
+returns a Future; the UI shows a pending state and picks the result up on a
+later rerun. Calls submitted under the same key while one is in flight share it.
+BACKGROUND calls run on their own small pool: they may block in the quota
+bucket below its reserve floor, and must not tie up the interactive workers.
+"""
+import functools, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from ims_quota import BACKGROUND, INTERACTIVE
+
+RATE_LIMIT_MARKERS = ("429", "Quota exceeded", "rate limit")
+
+
+def is_rate_limited(exc):
+    msg = str(exc)
+    return any(t in msg for t in RATE_LIMIT_MARKERS)
+
+
+def retrying(fn, max_retries=4, base=1.0, mult=2.0, max_sleep=6.0):
+    """Exponential backoff on rate-limit errors; meant for worker threads."""
+    @functools.wraps(fn)
+    def wrapper(*a, **k):
+        attempt = 0
+        while True:
+            try: return fn(*a, **k)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt >= max_retries: raise
+                time.sleep(min(max_sleep, base * (mult ** attempt)) + random.uniform(0, 0.3)); attempt += 1
+    return wrapper
+
+
+class ApiScheduler:
+    def __init__(self, quota=None, max_workers=4, background_workers=1):
+        self.quota = quota
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ims-api")
+        self._bg_pool = ThreadPoolExecutor(max_workers=background_workers, thread_name_prefix="ims-api-bg")
+        self._futures, self._lock = {}, threading.RLock()
+
+    def submit(self, key, fn, *args, priority=INTERACTIVE, **kwargs):
+        """Run `fn(*args, **kwargs)` on the pool.
+
+        With a key, an in-flight call (or a failed one not yet `forget`-ed) is reused
+        instead of starting another. Successful keyed calls drop out on completion.
+        """
+        with self._lock:
+            fut = self._futures.get(key) if key is not None else None
+            if fut is None:
+                pool = self._bg_pool if priority == BACKGROUND else self._pool
+                fut = pool.submit(self._run, fn, args, kwargs, priority)
+                if key is not None:
+                    self._futures[key] = fut
+                    fut.add_done_callback(functools.partial(self._on_done, key))
+            return fut
+
+    def peek(self, key):
+        with self._lock: return self._futures.get(key)
+
+    def forget(self, key):
+        with self._lock: self._futures.pop(key, None)
+
+    def _on_done(self, key, fut):
+        if fut.cancelled() or fut.exception() is None:
+            with self._lock:
+                if self._futures.get(key) is fut: del self._futures[key]
+
+    def _run(self, fn, args, kwargs, priority):
+        call = retrying(fn)
+        if self.quota is None: return call(*args, **kwargs)
+        with self.quota.priority(priority):
+            return call(*args, **kwargs)
+
+
+class FetchJob:
+    """Handle for a multi-sheet fetch; results arrive per batch as requests complete."""
+
+    def __init__(self, total):
+        self.total, self.results, self.errors = total, {}, {}
+        self.futures, self._batches_done = [], 0
+        self._cond = threading.Condition()
+
+    def _collect(self, names, on_result, fut):
+        """Done-callback for one batch; always counts the batch so `wait()` cannot hang."""
+        try:
+            exc = fut.exception()
+            if exc is None and on_result:
+                for n, values in zip(names, fut.result()):
+                    try: on_result(n, values)
+                    except Exception as e:
+                        with self._cond: self.errors[n] = e
+            with self._cond:
+                if exc is not None:
+                    for n in names: self.errors[n] = exc
+                else:
+                    self.results.update((n, v) for n, v in zip(names, fut.result()) if n not in self.errors)
+        finally:
+            with self._cond:
+                self._batches_done += 1
+                self._cond.notify_all()
+
+    @property
+    def completed(self):
+        with self._cond: return len(self.results) + len(self.errors)
+
+    def done(self):
+        with self._cond: return self._batches_done == len(self.futures)
+
+    def wait(self, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self._batches_done == len(self.futures), timeout)
+        return self.results
+
+
+class FetchEngine:
+    """Reads many worksheets concurrently on the scheduler's bounded pool.
+
+    Worksheets are grouped `batch` at a time into one `batch_get` request, and
+    every request still takes a token from the shared quota via the backend.
+    """
+
+    def __init__(self, scheduler, batch=10):
+        self.scheduler, self.batch = scheduler, batch
+
+    def start(self, backend, names, rng=None, priority=INTERACTIVE, on_result=None):
+        names = list(names)
+        job = FetchJob(len(names))
+        for i in range(0, len(names), self.batch):
+            chunk = names[i:i+self.batch]
+            fut = self.scheduler.submit(None, backend.batch_get, [(n, rng) for n in chunk], priority=priority)
+            job.futures.append(fut)
+            fut.add_done_callback(functools.partial(job._collect, chunk, on_result))
+        return job
+
+    def fetch_all(self, backend, names, rng=None, priority=INTERACTIVE):
+        """Blocking variant for background threads: {name: values}; raises the first error."""
+        job = self.start(backend, names, rng, priority)
+        job.wait()
+        if job.errors: raise next(iter(job.errors.values()))
+        return job.results
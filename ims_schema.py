@@ -0,0 +1,248 @@
+"""Header normalisation and config <-> sheet schema binding.
+
+`bind_schema(headers, cfg)` compiles, once per (actual headers, expected
+headers) pair, the normalised lookup tables and a positional plan for laying
+out a row in sheet column order. Submits, header checks and bulk imports reuse
+the same binding instead of re-normalising every header per call.
+
+`prepare_import` maps and validates an uploaded table against a binding,
+column-wise, for the bulk import path.
+
+`ConfigRegistry` parses the form-config JSON files into read-only `FormConfig`
+objects (still dicts, so JSON/hashing/pickling keep working) carrying the
+derived lists consumers used to rebuild per call, and re-parses a file only
+when its mtime changes.
+"""
+import functools, hashlib, json, os, re, threading, unicodedata
+
+import pandas as pd
+
+from ims_frames import column_kind, to_dates
+
+_ASCII_EQUIV = str.maketrans({'\u2018': "'", '\u2019': "'", '\u201C': '"', '\u201D': '"',
+                              '\u2013': '-', '\u2014': '-', '\u00A0': ' '})
+_SPACES = re.compile(r'\s+')
+
+
+def _to_ascii_equiv(s: str) -> str:
+    return s.translate(_ASCII_EQUIV)
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_header(h: str) -> str:
+    if not isinstance(h, str): return ""
+    s = _to_ascii_equiv(h.strip())
+    s = unicodedata.normalize('NFKC', s)
+    s = _SPACES.sub(' ', s)
+    return s.lower()
+
+
+CONFIG_FILES = {"LW FILES": "form_configs.json", "M&PR FILES": "forms_mpr_configs.json"}
+
+
+def expected_headers_from_config(cfg: dict):
+    if isinstance(cfg, FormConfig): return list(cfg.expected)
+    return list(cfg.get("fields", [])) + list(cfg.get("signatures", []))
+
+
+# =========================
+# Config registry
+# =========================
+TEXTAREA_HINTS = ('description', 'details', 'notes', 'remarks', 'comment', 'address', 'specification', 'procedure')
+
+
+def _frozen(*_a, **_k):
+    raise TypeError("FormConfig is read-only")
+
+
+class FormConfig(dict):
+    """One form's parsed config (read-only; list values become tuples) plus derived lookups.
+
+    expected/norm_expected: fields then signatures, raw and normalised.
+    widgets: "textarea" or "input" per field (by name; long values still get a textarea).
+    signature_positions: indices of the signatures within `expected`.
+    digest: stable hash of the config, for cache keys.
+    """
+    __slots__ = ("name", "title", "fields", "signatures", "expected", "norm_expected", "widgets",
+                 "signature_positions", "digest")
+
+    def __init__(self, name, raw):
+        super().__init__({k: tuple(v) if isinstance(v, list) else v for k, v in raw.items()})
+        fields, sigs = tuple(self.get("fields", ())), tuple(self.get("signatures", ()))
+        set_ = functools.partial(object.__setattr__, self)
+        set_("name", name); set_("title", self.get("title", name))
+        set_("fields", fields); set_("signatures", sigs)
+        set_("expected", fields + sigs)
+        set_("norm_expected", tuple(normalize_header(h) for h in fields + sigs))
+        set_("widgets", tuple("textarea" if any(k in f.lower() for k in TEXTAREA_HINTS) else "input" for f in fields))
+        set_("signature_positions", tuple(range(len(fields), len(fields) + len(sigs))))
+        set_("digest", hashlib.sha1(json.dumps(self, sort_keys=True, ensure_ascii=False).encode()).hexdigest())
+
+    __setitem__ = __delitem__ = __setattr__ = __delattr__ = _frozen
+    clear = pop = popitem = setdefault = update = __ior__ = _frozen
+
+    def __reduce__(self):
+        return FormConfig, (self.name, dict(self))
+
+
+class ConfigRegistry:
+    """{sheet type: {form name: FormConfig}}, re-parsed only when a file's mtime changes.
+
+    If a changed file fails to parse, the last good configs stay in use and the
+    error is kept in `errors[sheet_type]`; with no good copy the error is raised.
+    """
+
+    def __init__(self, files=None):
+        self.files = dict(files or CONFIG_FILES)
+        self.errors = {}
+        self._loaded, self._lock = {}, threading.Lock()  # sheet_type -> (mtime_ns, {name: FormConfig})
+
+    def get(self, sheet_type):
+        path = self.files.get(sheet_type, "forms_mpr_configs.json")
+        with self._lock:
+            cached = self._loaded.get(sheet_type)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                if cached and cached[0] == mtime: return cached[1]
+                with open(path, "r", encoding="utf-8") as f:
+                    forms = {name: FormConfig(name, raw) for name, raw in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                if cached is None: raise
+                self.errors[sheet_type] = e
+                return cached[1]
+            self._loaded[sheet_type] = (mtime, forms)
+            self.errors.pop(sheet_type, None)
+            return forms
+
+
+class SchemaBinding:
+    """Expected (config) headers bound to a sheet's actual header row.
+
+    `plan[i]` is the position in `expected` that feeds sheet column i (None if
+    the column has no config field), so assembling a row is a single pass.
+    """
+
+    def __init__(self, headers, expected):
+        self.headers, self.expected = tuple(headers), tuple(expected)
+        self.norm_actual = tuple(normalize_header(h) for h in self.headers)
+        self.norm_expected = tuple(normalize_header(e) for e in self.expected)
+
+        self.norm_to_actual, self.problems = {}, []
+        first_actual = {}
+        for a, na in zip(self.headers, self.norm_actual):
+            if na in self.norm_to_actual and self.norm_to_actual[na] != a:
+                self.problems.append(f"Collision after normalization: '{self.norm_to_actual[na]}' vs '{a}'")
+            self.norm_to_actual[na] = a
+            first_actual.setdefault(na, a)
+        only_after_norm = [(e, self.norm_to_actual[ne]) for e, ne in zip(self.expected, self.norm_expected)
+                           if ne in self.norm_to_actual and e != self.norm_to_actual[ne]]
+        if only_after_norm:
+            self.problems.append("Matched after normalization: " + ", ".join([f"'{a}' ↔ '{b}'" for a, b in only_after_norm]))
+
+        last_expected, first_expected = {}, {}
+        for i, ne in enumerate(self.norm_expected):
+            last_expected[ne] = i  # later config entries win, as a dict payload would
+            first_expected.setdefault(ne, i)
+        self.plan = tuple(last_expected.get(na) for na in self.norm_actual)
+        self.positions = {}
+        for i, na in enumerate(self.norm_actual): self.positions.setdefault(na, i + 1)
+
+        self.missing = [self.expected[first_expected[ne]] for ne in self.norm_expected if ne not in self.norm_to_actual]
+        self.extra = [first_actual[na] for na in self.norm_actual if na not in first_expected]
+        self.order_match = self.norm_actual == self.norm_expected
+
+    def column_of(self, header):
+        """1-based sheet column holding `header` (matched after normalisation), or None."""
+        return self.positions.get(normalize_header(header))
+
+    def row_from_values(self, values):
+        """Values aligned with `expected` -> row in sheet column order (all strings)."""
+        return ["" if i is None or i >= len(values) or values[i] is None else str(values[i]) for i in self.plan]
+
+    def row_from(self, payload):
+        """{config header: value} -> row in sheet column order."""
+        norm = {normalize_header(k): v for k, v in payload.items()}
+        return self.row_from_values([norm.get(ne) for ne in self.norm_expected])
+
+    def diff(self):
+        return {
+            "missing_in_sheet": list(self.missing),
+            "extra_in_sheet": list(self.extra),
+            "order_match": self.order_match,
+            "expected": list(self.expected),
+            "actual": list(self.headers),
+            "notes": list(self.problems),
+        }
+
+
+@functools.lru_cache(maxsize=256)
+def _bind(headers, expected):
+    return SchemaBinding(headers, expected)
+
+
+def bind_schema(headers, cfg):
+    """Cached SchemaBinding for this header row and form config."""
+    return _bind(tuple(headers or ()), tuple(expected_headers_from_config(cfg or {})))
+
+
+def build_header_mapping(actual_headers, expected_headers):
+    b = _bind(tuple(actual_headers), tuple(expected_headers))
+    return dict(b.norm_to_actual), list(b.norm_expected), list(b.problems)
+
+
+def diff_config_vs_sheet(config, headers):
+    return bind_schema(headers, config).diff()
+
+
+# =========================
+# Bulk import
+# =========================
+SIGNED, UNSIGNED = "✔️ Yes", "❌ No"
+_YES = {"✔️ yes", "✔️", "✔", "yes", "y", "true", "1", "signed"}
+_NO = {"❌ no", "❌", "no", "n", "false", "0", ""}
+
+
+def prepare_import(frame, cfg, headers):
+    """Uploaded table (all-string DataFrame) -> (rows, rejects, notes).
+
+    rows are in sheet column order, ready for append_rows; rejects is the
+    uploaded rows that failed validation plus a "Reason" column (index = upload
+    line number); notes lists unmatched and missing columns.
+    """
+    binding = bind_schema(headers, cfg)
+    sigs = {normalize_header(h) for h in (cfg or {}).get("signatures", [])}
+    norm_cols = [normalize_header(str(c)) for c in frame.columns]
+    known = set(binding.norm_expected)
+    source = {}
+    for j, nc in enumerate(norm_cols): source.setdefault(nc, j)
+    notes = []
+    unmatched = [str(c) for c, nc in zip(frame.columns, norm_cols) if nc not in known]
+    missing = [e for e, ne in zip(binding.expected, binding.norm_expected) if ne not in source and ne not in sigs]
+    if unmatched: notes.append("Ignored columns: " + ", ".join(unmatched))
+    if missing: notes.append("Not in file (left blank): " + ", ".join(missing))
+
+    frame = frame.reset_index(drop=True)
+    blank_col = pd.Series("", index=frame.index)
+    values, reason, any_value = [], pd.Series("", index=frame.index), pd.Series(False, index=frame.index)
+    for e, ne in zip(binding.expected, binding.norm_expected):
+        col = frame.iloc[:, source[ne]].fillna("").astype(str).str.strip() if ne in source else blank_col
+        blank = col.eq("")
+        if ne in sigs:
+            low = col.str.lower()
+            bad, label = ~low.isin(_YES | _NO), "signature"
+            col = low.isin(_YES).map({True: SIGNED, False: UNSIGNED})
+        else:
+            any_value |= ~blank
+            label = column_kind(e, cfg)
+            if label == "date": bad = to_dates(col).isna() & ~blank
+            elif label == "number": bad = pd.to_numeric(col.str.replace(",", "", regex=False), errors="coerce").isna() & ~blank
+            else: bad = None
+        if bad is not None and bad.any(): reason = reason.where(~bad, reason + f"; bad {label} in '{e}'")
+        values.append(col.tolist())
+    reason = reason.where(any_value, reason + "; empty row").str.lstrip("; ")
+
+    ok = reason.eq("").to_numpy()
+    rows = [binding.row_from_values(v) for v, keep in zip(zip(*values), ok) if keep]
+    rejects = frame[~ok].assign(Reason=reason[~ok])
+    rejects.index = rejects.index + 2  # line number in the uploaded file (header is line 1)
+    return rows, rejects, notes
@@ -0,0 +1,79 @@
+"""Process-wide buffered write queue.
+
+Rows submitted for the same worksheet are collected and written with a single
+`append_rows` call, either after `flush_interval` seconds or as soon as
+`max_batch` rows are pending. Each submission gets a Future that resolves to
+the sheet row number its row landed on once the batch is committed.
+"""
+import threading, time
+from concurrent.futures import Future
+
+
+class WriteQueue:
+    def __init__(self, append_rows, flush_interval=0.5, max_batch=50, on_commit=None):
+        # append_rows(sheet_name, rows) -> sheet row number of the first appended row
+        self.append_rows, self.flush_interval, self.max_batch = append_rows, flush_interval, max_batch
+        self.on_commit = on_commit  # on_commit(sheet_name, start_row, rows)
+        self.stats = {"rows": 0, "batches": 0, "errors": 0}
+        self._pending = {}    # sheet_name -> [(row, future), ...]
+        self._deadline = {}   # sheet_name -> monotonic flush time
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="ims-write-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, sheet_name, row):
+        fut = Future()
+        with self._cond:
+            batch = self._pending.setdefault(sheet_name, [])
+            batch.append((list(row), fut))
+            self._deadline.setdefault(sheet_name, time.monotonic() + self.flush_interval)
+            if len(batch) >= self.max_batch: self._deadline[sheet_name] = 0
+            self._cond.notify()
+        return fut
+
+    def pending(self, sheet_name=None):
+        with self._cond:
+            if sheet_name is not None: return len(self._pending.get(sheet_name, []))
+            return sum(len(b) for b in self._pending.values())
+
+    def flush(self, sheet_name=None):
+        """Ask the worker to write now (all sheets, or just one)."""
+        with self._cond:
+            for name in ([sheet_name] if sheet_name else list(self._deadline)):
+                if name in self._deadline: self._deadline[name] = 0
+            self._cond.notify()
+
+    def _take_due(self):
+        now = time.monotonic()
+        due = [n for n, t in self._deadline.items() if t <= now]
+        out = []
+        for n in due:
+            batch = self._pending.pop(n, []); self._deadline.pop(n, None)
+            for i in range(0, len(batch), self.max_batch):
+                out.append((n, batch[i:i+self.max_batch]))
+        return out
+
+    def _commit(self, sheet_name, batch):
+        rows = [r for r, _ in batch]
+        try:
+            start = self.append_rows(sheet_name, rows)
+        except Exception as e:
+            self.stats["errors"] += 1
+            for _, fut in batch: fut.set_exception(e)
+            return
+        self.stats["rows"] += len(rows); self.stats["batches"] += 1
+        if self.on_commit:
+            try: self.on_commit(sheet_name, start, rows)
+            except Exception: pass  # a cache patch failure must not fail the write
+        for i, (_, fut) in enumerate(batch): fut.set_result(start + i)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                work = self._take_due()
+                while not work:
+                    timeout = (min(self._deadline.values()) - time.monotonic()) if self._deadline else None
+                    self._cond.wait(timeout if timeout is None else max(timeout, 0))
+                    work = self._take_due()
+            for sheet_name, batch in work:
+                self._commit(sheet_name, batch)
@@ -1,8 +1,7 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from ims_backend import SHEET_IDS, open_backend
 
 # === Setup ===
-SHEET_ID = "1wxntHZp4xEQWCmLAt2TVF8ohG6uHuvV_3QbaK7wSwGw"
+SHEET_ID = SHEET_IDS["LW FILES"]
 CREDENTIALS_FILE = "imscredentials.json"
 
 # === Mapping: Old Sheet Name => New Sheet Name ===
@@ -23,23 +22,13 @@ RENAME_MAP = {
 
 def rename_worksheets():
     try:
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        creds = ServiceAccountCredentials.from_json_keyfile_name(CREDENTIALS_FILE, scope)
-        client = gspread.authorize(creds)
-
-        sheet = client.open_by_key(SHEET_ID)
-        worksheets = sheet.worksheets()
-        worksheet_titles = [ws.title for ws in worksheets]
+        backend = open_backend(SHEET_ID, credential_file=CREDENTIALS_FILE)
+        worksheet_titles = backend.list_worksheets()
 
         print("🔍 Checking worksheets...")
         for old_name, new_name in RENAME_MAP.items():
             if old_name in worksheet_titles:
-                ws = sheet.worksheet(old_name)
-                ws.update_title(new_name)
+                backend.rename_worksheet(old_name, new_name)
                 print(f"✅ Renamed: '{old_name}' → '{new_name}'")
             else:
                 print(f"❌ Skipped: '{old_name}' not found")
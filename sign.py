@@ -1,26 +1,21 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from ims_backend import SHEET_IDS, open_backend
 
-scope = [
-    "https://spreadsheets.google.com/feeds",
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
-
-creds = ServiceAccountCredentials.from_json_keyfile_name("imscredentials.json", scope)
-client = gspread.authorize(creds)
-spreadsheet = client.open("LW FILES")
+backend = open_backend(SHEET_IDS["LW FILES"])
+sheet_names = backend.list_worksheets()
 
 signature_columns_by_sheet = {}
 
-for worksheet in spreadsheet.worksheets():
-    try:
-        headers = worksheet.row_values(1)
-        signature_cols = [col for col in headers if "sign" in col.lower()]
-        if signature_cols:
-            signature_columns_by_sheet[worksheet.title] = signature_cols
-    except Exception as e:
-        print(f"Error reading {worksheet.title}: {e}")
+try:
+    all_headers = backend.batch_get([(name, "1:1") for name in sheet_names])
+except Exception as e:
+    print(f"Error reading headers: {e}")
+    all_headers = []
+
+for name, grid in zip(sheet_names, all_headers):
+    headers = grid[0] if grid else []
+    signature_cols = [col for col in headers if "sign" in col.lower()]
+    if signature_cols:
+        signature_columns_by_sheet[name] = signature_cols
 
 # Display result
 print("Signature Fields Detected:")
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ims_frames import (SearchIndex, cell_diff, column_kind, condition_mask, filter_mask, frame_from_grid,
+                        stale_cells, stale_rows, to_dates, unique_headers)
+
+CFG = {"fields": ["Date", "Item", "Qty", "Remarks"], "signatures": ["QA Sign"]}
+GRID = [["Date", "Item", "Qty", "Remarks", "QA Sign"],
+        ["01/02/2024", "Bolt M8", "1,200", "ok", "✔️ Yes"],
+        ["15/02/2024", "Nut", "7"],
+        ["", "Washer A-12", "", "", "❌ No"]]
+
+
+def test_column_kinds_from_names_and_config():
+    assert column_kind("Date", CFG) == "date" and column_kind("Qty", CFG) == "number"
+    assert column_kind("QA Sign", CFG) == "category" and column_kind("Remarks", CFG) == "text"
+    assert column_kind("Remarks", {"types": {"Remarks": "category"}}) == "category"
+
+
+def test_frame_from_grid_pads_short_rows_and_keeps_strings_untyped():
+    f = frame_from_grid(GRID, CFG, typed=False)
+    assert list(f.columns) == GRID[0] and len(f) == 3
+    assert f.iloc[1].tolist() == ["15/02/2024", "Nut", "7", "", ""]
+    assert f["Qty"].tolist() == ["1,200", "7", ""]
+
+
+def test_frame_from_grid_typed_parses_dates_and_numbers():
+    f = frame_from_grid(GRID, CFG, typed=True)
+    assert pd.api.types.is_datetime64_any_dtype(f["Date"]) and f["Date"][0] == pd.Timestamp(2024, 2, 1)
+    assert f["Qty"][0] == 1200 and np.isnan(f["Qty"][2])
+    assert f["QA Sign"].dtype == "category"
+
+
+def test_frame_from_grid_keeps_text_when_a_cell_does_not_parse():
+    f = frame_from_grid([["Qty"], ["3"], ["lots"]], typed=True)
+    assert f["Qty"].tolist() == ["3", "lots"]
+
+
+def test_duplicate_headers_get_unique_column_names():
+    assert unique_headers(["", "A", "", "A", "A.1", ""]) == ["", "A", ".1", "A.2", "A.1", ".2"]
+    f = frame_from_grid([["Item", "", ""], ["Bolt", "x", "y"]], typed=False)
+    assert list(f.columns) == ["Item", "", ".1"] and f[".1"].tolist() == ["y"]
+
+
+def test_empty_grids():
+    assert frame_from_grid([]).empty
+    assert list(frame_from_grid([["A", "B"]]).columns) == ["A", "B"]
+
+
+def test_cell_diff_reports_sheet_coordinates():
+    before = frame_from_grid(GRID, typed=False).astype(object)
+    after = before.copy(); after.iat[1, 2] = "8"
+    assert cell_diff(before, after) == [(3, 3, "8")]
+
+
+def test_stale_cells_and_rows():
+    base = frame_from_grid(GRID, typed=False).astype(object); base.index += 2
+    current = base.copy(); current.iat[0, 1] = "Bolt M10"
+    assert stale_cells(base, current, [(2, 2, "x"), (3, 2, "y")]) == [(2, 2, "x")]
+    assert stale_rows(base, current.drop(index=4), [2, 3, 4]) == [2, 4]
+    assert stale_cells(base, current.rename(columns={"Qty": "Q"}), [(3, 1, "z")]) == [(3, 1, "z")]
+
+
+@pytest.mark.parametrize("kind, op, value, expected", [
+    ("number", ">", 100, [True, False, False]),
+    ("number", "between", (5, 10), [False, True, False]),
+    ("number", "is blank", None, [False, False, True]),
+    ("text", "contains", "bolt", [True, False, False]),
+    ("text", "in", ["Nut", "Washer A-12"], [False, True, True]),
+    ("signature", "signed", None, [True, False, False]),
+])
+def test_condition_mask(kind, op, value, expected):
+    f = frame_from_grid(GRID, CFG, typed=True)
+    col = {"number": "Qty", "text": "Item", "signature": "QA Sign"}[kind]
+    assert condition_mask(f[col], kind, op, value).tolist() == expected
+
+
+def test_condition_mask_dates_parse_day_first():
+    f = frame_from_grid(GRID, CFG, typed=False)
+    assert condition_mask(f["Date"], "date", ">=", pd.Timestamp(2024, 2, 10)).tolist() == [False, True, False]
+
+
+def test_to_dates_parses_each_value_on_its_own():
+    mixed = to_dates(pd.Series(["20/03/2024", "2024-03-05", "5 Mar 2024", "2024-03-20", "", "soon"]))
+    assert mixed[:4].tolist() == [pd.Timestamp(2024, 3, 20), pd.Timestamp(2024, 3, 5),
+                                  pd.Timestamp(2024, 3, 5), pd.Timestamp(2024, 3, 20)]
+    assert mixed[4:].isna().all()
+    iso = to_dates(pd.Series(["2024-03-05", "2024-03-20"]))
+    assert iso.tolist() == [pd.Timestamp(2024, 3, 5), pd.Timestamp(2024, 3, 20)]
+
+
+def test_frame_from_grid_types_a_mixed_format_date_column():
+    f = frame_from_grid([["Date"], ["20/03/2024"], ["2024-03-05"]], typed=True)
+    assert pd.api.types.is_datetime64_any_dtype(f["Date"]) and f["Date"][1] == pd.Timestamp(2024, 3, 5)
+
+
+def test_filter_mask_ands_conditions_and_skips_unknown_columns():
+    f = frame_from_grid(GRID, CFG, typed=True)
+    kinds = {"Qty": "number", "Item": "text"}
+    conds = [{"column": "Qty", "op": "not blank"}, {"column": "Item", "op": "contains", "value": "n"},
+             {"column": "Gone", "op": "==", "value": "x"}]
+    assert filter_mask(f, conds, kinds).tolist() == [False, True, False]
+
+
+def _search_frame(n):
+    items = ["Bolt M8", "Nut", "Washer A-12", "Pump seal 12/03", "Valve"]
+    return pd.DataFrame({"Item": [items[i % 5] for i in range(n)], "Ref": [f"R{i}" for i in range(n)]})
+
+
+def test_search_is_substring_case_insensitive_and_ands_terms():
+    idx = SearchIndex(_search_frame(10))
+    assert idx.mode == "scan"
+    assert idx.search("ASHER").tolist() == [2, 7]
+    assert idx.search("nut r1").tolist() == [1]
+    assert idx.search("").tolist() == list(range(10))
+
+
+def test_search_does_not_match_across_cells():
+    idx = SearchIndex(pd.DataFrame({"a": ["ab"], "b": ["cd"]}))
+    assert idx.search("bc").tolist() == []
+
+
+def test_search_results_do_not_change_with_the_token_index(monkeypatch):
+    frame = _search_frame(60)
+    scan = SearchIndex(frame)
+    monkeypatch.setattr(SearchIndex, "TOKEN_INDEX_MIN_ROWS", 50)
+    indexed = SearchIndex(frame)
+    assert indexed.mode == "indexed"
+    for q in ["ash", "a-1", "12/0", "sea 2/", "r5", "-", "valve r59", "zzz"]:
+        assert indexed.search(q).tolist() == scan.search(q).tolist(), q
@@ -0,0 +1,64 @@
+import os
+import time
+
+import pytest
+
+from ims_jobs import DONE, ERROR, QUEUED, RUNNING, JobStore, worker_lock
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"), str(tmp_path / "artifacts"), ttl=60)
+
+
+def test_lifecycle_queued_running_done(store):
+    job_id = store.submit("table", {"rows": [[1]]}, "LW1 table", owner="ana")
+    assert store.get(job_id)["status"] == QUEUED
+    job = store.claim()
+    assert job["id"] == job_id and store.get(job_id)["status"] == RUNNING
+    assert store.get(job_id)["worker"] == os.getpid()
+    assert store.claim() is None
+    store.progress(job_id, 0.5, "Rendered 1/2")
+    assert store.get(job_id)["progress"] == 0.5
+    store.finish(job_id, b"%PDF", "t.pdf", "application/pdf")
+    done = store.get(job_id)
+    assert done["status"] == DONE and store.read_artifact(done) == b"%PDF"
+
+
+def test_claim_takes_the_oldest_job_first(store):
+    first = store.submit("rows", {}, "a"); store.submit("rows", {}, "b")
+    assert store.claim()["id"] == first
+
+
+def test_fail_and_recent_filtered_by_owner(store):
+    a = store.submit("rows", {}, "a", owner="ana"); store.submit("rows", {}, "b", owner="ben")
+    store.fail(a, "boom")
+    mine = store.recent(owner="ana")
+    assert [j["id"] for j in mine] == [a] and mine[0]["status"] == ERROR and mine[0]["message"] == "boom"
+    assert "params" not in mine[0]
+
+
+def test_requeue_only_resets_jobs_of_other_workers(store):
+    job_id = store.submit("rows", {}, "a"); store.claim()
+    store.requeue_running()
+    assert store.get(job_id)["status"] == RUNNING  # ours
+    store._conn.execute("UPDATE jobs SET worker=-1")
+    store.requeue_running()
+    assert store.get(job_id)["status"] == QUEUED
+
+
+def test_purge_removes_old_finished_jobs_and_files(store):
+    job_id = store.submit("rows", {}, "a"); store.claim()
+    store.finish(job_id, b"x", "a.zip", "application/zip")
+    path = store.get(job_id)["artifact"]
+    store._conn.execute("UPDATE jobs SET updated=?", (time.time() - 3600,))
+    assert store.purge() == 1
+    assert store.get(job_id) is None and not os.path.exists(path)
+
+
+def test_one_worker_lock_per_database(tmp_path):
+    db = str(tmp_path / "jobs.sqlite3")
+    held = worker_lock(db)
+    assert held is not None and worker_lock(db) is None
+    held.close()
+    assert worker_lock(db) is not None
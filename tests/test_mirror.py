@@ -0,0 +1,124 @@
+from ims_backend import LocalBackend
+from ims_mirror import SheetMirror, MirrorSync, TTLCache
+
+SID = "sheet"
+
+
+def grid():
+    return [["Date", "Item", "Qty"], ["01/01/2024", "Bolt", "4"], ["02/01/2024", "Nut", "7"]]
+
+
+def test_replace_then_read_round_trips_and_bumps_version():
+    m = SheetMirror(":memory:")
+    assert m.read(SID, "A") is None and m.version(SID, "A") is None
+    assert m.replace(SID, "A", grid()) == 3  # two rows + header
+    assert m.read(SID, "A") == grid()
+    assert m.version(SID, "A") == 1 and m.row_count(SID, "A") == 3
+    assert m.read_versioned(SID, "A") == (1, grid()) and m.read_versioned(SID, "B") == (None, None)
+
+
+def test_replace_with_same_data_keeps_version():
+    m = SheetMirror(":memory:")
+    m.replace(SID, "A", grid())
+    assert m.replace(SID, "A", grid()) == 0
+    assert m.version(SID, "A") == 1
+
+
+def test_replace_writes_only_changed_rows_and_drops_removed_ones():
+    m = SheetMirror(":memory:")
+    m.replace(SID, "A", grid())
+    changed = grid()[:2]
+    changed[1] = ["01/01/2024", "Bolt", "5"]
+    assert m.replace(SID, "A", changed) == 2  # one update, one delete
+    assert m.read(SID, "A") == changed and m.version(SID, "A") == 2
+
+
+def test_blank_rows_keep_sheet_row_numbers():
+    m = SheetMirror(":memory:")
+    m.replace(SID, "A", [["H"], ["a"], [], ["c"]])
+    assert m.read(SID, "A") == [["H"], ["a"], [], ["c"]]
+    assert m.read_rows(SID, "A", 2, 4) == [["a"], [], ["c"]]
+
+
+def test_put_rows_patches_known_rows_and_bumps():
+    m = SheetMirror(":memory:")
+    assert m.put_rows(SID, "A", 2, [["x"]]) is False  # not mirrored: no-op
+    m.replace(SID, "A", grid())
+    assert m.put_rows(SID, "A", 4, [["03/01/2024", "Washer", "1"]])
+    assert m.read(SID, "A")[-1] == ["03/01/2024", "Washer", "1"]
+    assert m.version(SID, "A") == 2
+
+
+def test_update_cells_pads_rows_and_can_change_headers():
+    m = SheetMirror(":memory:")
+    assert m.update_cells(SID, "A", [(2, 1, "x")]) is False  # not mirrored: no-op
+    assert not m.has(SID, "A")
+    m.replace(SID, "A", grid())
+    m.update_cells(SID, "A", [(2, 3, "9"), (3, 5, "late"), (1, 4, "Note")])
+    values = m.read(SID, "A")
+    assert values[0] == ["Date", "Item", "Qty", "Note"]
+    assert values[1] == ["01/01/2024", "Bolt", "9"]
+    assert values[2] == ["02/01/2024", "Nut", "7", "", "late"]
+    assert m.version(SID, "A") == 2
+
+
+def test_revision_changes_with_any_sheet_version():
+    m = SheetMirror(":memory:")
+    m.replace(SID, "A", grid())
+    before = m.revision(SID)
+    m.update_cells(SID, "A", [(2, 1, "x")])
+    assert m.revision(SID) != before
+
+
+def test_forget_and_rename():
+    m = SheetMirror(":memory:")
+    m.replace(SID, "A", grid())
+    m.rename(SID, "A", "B")
+    assert m.names(SID) == ["B"] and m.read(SID, "B") == grid()
+    m.forget(SID, "B")
+    assert not m.has(SID, "B")
+
+
+def test_sync_skips_download_when_probe_revision_is_unchanged():
+    source = LocalBackend(SID)
+    source.add_worksheet("A", grid()[0]); source.append_rows("A", grid()[1:])
+    fetches = []
+    def fetch(sheet_id):
+        fetches.append(sheet_id)
+        return {n: source.get_values(n) for n in source.list_worksheets()}
+    mirror = SheetMirror(":memory:")
+    sync = MirrorSync(mirror, [SID], fetch, probe=lambda sid: source.revision())
+    sync.sync_once(); sync.sync_once()
+    assert len(fetches) == 1 and sync.stats["skipped"] == 1
+    assert mirror.read(SID, "A") == grid()
+    source.append_rows("A", [["04/01/2024", "Pin", "2"]])
+    sync.sync_once()
+    assert len(fetches) == 2 and mirror.row_count(SID, "A") == 4
+
+
+def test_sync_drops_worksheets_that_disappeared():
+    mirror = SheetMirror(":memory:")
+    mirror.replace(SID, "Old", grid())
+    MirrorSync(mirror, [SID], lambda sid: {"A": grid()}).sync_once()
+    assert mirror.names(SID) == ["A"]
+
+
+def test_sync_records_local_write_errors_and_moves_on():
+    mirror, errors = SheetMirror(":memory:"), []
+    def replace(sheet_id, name, values): raise RuntimeError("database is locked")
+    mirror.replace = replace
+    sync = MirrorSync(mirror, [SID, "other"], lambda sid: {"A": grid()}, on_error=lambda sid, e: errors.append(sid))
+    sync.sync_once()
+    assert errors == [SID, "other"] and str(sync.last_error) == "database is locked"
+    assert sync.last_run > 0
+
+
+def test_ttl_cache_expires_and_evicts_lru():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.put("a", 1); c.put("b", 2); c.get("a"); c.put("c", 3)
+    assert c.get("b") is None and c.get("a") == 1 and c.get("c") == 3
+    c.discard_where(lambda k: k == "a")
+    assert c.get("a") is None
+    expired = TTLCache(ttl=-1)
+    expired.put("a", 1)
+    assert expired.get("a") is None
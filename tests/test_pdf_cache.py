@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("xhtml2pdf")
+import ims_pdf
+from ims_pdf import PdfCache, link_callback, pdf_key
+
+CFG = {"title": "Log", "fields": ["Item"], "signatures": []}
+
+
+def test_pdf_key_hashes_frames_by_value():
+    a = pd.DataFrame({"Item": ["Bolt", "Nut"]})
+    assert pdf_key("table", CFG, "LW1", a, "Landscape") == pdf_key("table", CFG, "LW1", a.copy(), "Landscape")
+    assert pdf_key("table", CFG, "LW1", a, "Landscape") != pdf_key("table", CFG, "LW1", a.iloc[::-1], "Landscape")
+    assert pdf_key("table", CFG, "LW1", a, "Landscape") != pdf_key("table", CFG, "LW1", a, "Portrait")
+    assert pdf_key("row", CFG, "LW1", 2, {"Item": "Bolt"}) != pdf_key("row", {**CFG, "title": "X"}, "LW1", 2, {"Item": "Bolt"})
+
+
+def test_memory_lru_is_bounded_by_bytes():
+    c = PdfCache(max_bytes=250)
+    c.put("a", b"a" * 100, 1); c.put("b", b"b" * 100, 2)
+    c.get("a")
+    c.put("c", b"c" * 100, 3)
+    assert c.get("b") is None and c.get("a") == (b"a" * 100, 1) and c.get("c")[1] == 3
+    assert c.stats == {"hits": 3, "disk_hits": 0, "misses": 1}
+
+
+def test_disk_tier_keeps_generated_at_across_instances(tmp_path):
+    PdfCache(disk_dir=str(tmp_path)).put("k", b"%PDF-data", 1234.5)
+    c = PdfCache(disk_dir=str(tmp_path))
+    assert c.get("k") == (b"%PDF-data", 1234.5) and c.stats["disk_hits"] == 1
+
+
+def test_disk_pruning_drops_least_recently_used(tmp_path):
+    writer = PdfCache(disk_dir=str(tmp_path), disk_max_bytes=300)
+    writer.put("a", b"a" * 100, 1); writer.put("b", b"b" * 100, 2)
+    old = time.time() - 100
+    os.utime(tmp_path / "a.pdf", (old, old)); os.utime(tmp_path / "b.pdf", (old - 1, old - 1))
+    c = PdfCache(disk_dir=str(tmp_path), disk_max_bytes=300)
+    assert c.get("b")  # a disk hit marks b as recently used
+    c.put("c", b"c" * 100, 3)
+    assert sorted(os.listdir(tmp_path)) == ["b.pdf", "c.pdf"]
+
+
+def test_fetch_renders_once_for_concurrent_callers():
+    c, renders = PdfCache(), []
+    def render(dt):
+        renders.append(dt); time.sleep(0.1); return b"pdf"
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(c.fetch("k", render))) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(renders) == 1
+    assert sorted(hit for _, _, hit in out) == [False, True, True, True]
+    assert len({ts for _, ts, _ in out}) == 1
+
+
+def test_link_callback_only_inlines_files_inside_templates(tmp_path, monkeypatch):
+    for d in ("templates", "templates_evil"):
+        (tmp_path / d).mkdir(); (tmp_path / d / "x.png").write_bytes(b"png")
+    monkeypatch.setattr(ims_pdf, "TEMPLATE_DIR", str(tmp_path / "templates"))
+    assert link_callback("x.png", None).startswith("data:image/png;base64,")
+    assert link_callback("../templates_evil/x.png", None) == "../templates_evil/x.png"
+    assert link_callback(str(tmp_path / "templates_evil" / "x.png"), None).startswith("/")
@@ -0,0 +1,49 @@
+import threading
+
+from ims_quota import BACKGROUND, INTERACTIVE, TokenBucket, shared_bucket
+
+
+def test_interactive_can_drain_the_bucket():
+    b = TokenBucket(capacity=4, period=3600)
+    assert all(b.try_acquire(priority=INTERACTIVE)[0] for _ in range(4))
+    ok, wait = b.try_acquire(priority=INTERACTIVE)
+    assert not ok and wait > 0
+    assert b.usage() == 4
+
+
+def test_background_stops_at_the_reserve_floor():
+    b = TokenBucket(capacity=8, period=3600, background_reserve=0.25)  # 2 tokens kept back
+    taken = 0
+    while b.try_acquire(priority=BACKGROUND)[0]: taken += 1
+    assert taken == 6
+    assert b.wait_time(priority=BACKGROUND) > 0 and b.wait_time(priority=INTERACTIVE) == 0
+    assert b.try_acquire(priority=INTERACTIVE)[0] and b.try_acquire(priority=INTERACTIVE)[0]
+
+
+def test_priority_scope_is_per_thread():
+    b = TokenBucket(capacity=4, period=3600, background_reserve=1.0)  # background never gets a token
+    seen = {}
+    with b.priority(BACKGROUND):
+        assert not b.try_acquire()[0]
+        t = threading.Thread(target=lambda: seen.update(ok=b.try_acquire()[0]))
+        t.start(); t.join()
+    assert seen["ok"] and b.try_acquire()[0]
+
+
+def test_acquire_times_out_instead_of_blocking():
+    b = TokenBucket(capacity=1, period=3600)
+    assert b.acquire(timeout=0.1)
+    assert not b.acquire(timeout=0.1)
+
+
+def test_sqlite_state_is_shared_between_buckets(tmp_path):
+    path = str(tmp_path / "quota.sqlite3")
+    a, b = TokenBucket(capacity=2, period=3600, state_path=path), TokenBucket(capacity=2, period=3600, state_path=path)
+    assert a.try_acquire()[0] and b.try_acquire()[0]
+    assert not a.try_acquire()[0]
+    assert b.usage() == 2
+
+
+def test_shared_bucket_is_one_per_state_file(tmp_path):
+    path = str(tmp_path / "q.sqlite3")
+    assert shared_bucket(path) is shared_bucket(path)
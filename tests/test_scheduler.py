@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from ims_backend import LocalBackend
+from ims_quota import BACKGROUND
+from ims_scheduler import ApiScheduler, FetchEngine, retrying
+
+
+@pytest.fixture
+def backend():
+    b = LocalBackend("sheet")
+    for name in "ABCDE":
+        b.add_worksheet(name, ["H"]); b.append_rows(name, [[name.lower()]])
+    return b
+
+
+def test_retrying_backs_off_only_on_rate_limits(monkeypatch):
+    monkeypatch.setattr("ims_scheduler.time.sleep", lambda s: None)
+    calls = []
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3: raise RuntimeError("APIError: [429] Quota exceeded")
+        return "ok"
+    assert retrying(flaky)() == "ok" and len(calls) == 3
+    with pytest.raises(ValueError):
+        retrying(lambda: (_ for _ in ()).throw(ValueError("bad")))()
+
+
+def test_keyed_submissions_share_one_call():
+    s, gate, calls = ApiScheduler(max_workers=2), threading.Event(), []
+    def slow():
+        calls.append(1); gate.wait(5); return len(calls)
+    f1, f2 = s.submit("k", slow), s.submit("k", slow)
+    assert f1 is f2
+    gate.set()
+    assert f1.result(5) == 1 and s.peek("k") is None
+
+
+def test_failed_keyed_call_is_kept_until_forgotten():
+    s = ApiScheduler()
+    fut = s.submit("k", lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError): fut.result(5)
+    assert s.submit("k", lambda: 1) is fut
+    s.forget("k")
+    assert s.submit("k", lambda: 1).result(5) == 1
+
+
+def test_background_calls_do_not_occupy_interactive_workers():
+    s, gate = ApiScheduler(max_workers=1, background_workers=1), threading.Event()
+    bg = s.submit(None, gate.wait, 5, priority=BACKGROUND)
+    assert s.submit(None, lambda: "interactive").result(2) == "interactive"
+    gate.set(); assert bg.result(5)
+
+
+def test_fetch_all_batches_every_worksheet(backend):
+    engine = FetchEngine(ApiScheduler(), batch=2)
+    out = engine.fetch_all(backend, backend.list_worksheets())
+    assert out == {n: [["H"], [n.lower()]] for n in "ABCDE"}
+
+
+def test_fetch_job_records_errors_per_worksheet(backend):
+    engine = FetchEngine(ApiScheduler(), batch=2)
+    job = engine.start(backend, ["A", "missing", "C"])
+    results = job.wait(5)
+    assert job.done() and set(results) == {"C"}
+    assert set(job.errors) == {"A", "missing"}  # the whole failed batch
+    assert job.completed == 3
+
+
+def test_fetch_job_completes_when_the_result_callback_fails(backend):
+    def on_result(name, values):
+        if name == "B": raise RuntimeError("database is locked")
+    job = FetchEngine(ApiScheduler(), batch=2).start(backend, "ABCDE", on_result=on_result)
+    results = job.wait(5)
+    assert job.done()
+    assert set(results) == {"A", "C", "D", "E"} and isinstance(job.errors["B"], RuntimeError)
@@ -0,0 +1,80 @@
+import json
+import os
+import pickle
+
+import pandas as pd
+import pytest
+
+from ims_schema import (ConfigRegistry, FormConfig, SIGNED, UNSIGNED, bind_schema, diff_config_vs_sheet,
+                        normalize_header, prepare_import)
+
+CFG = FormConfig("LW1", {"title": "Log", "fields": ["Date", "Item", "Qty", "Remarks"], "signatures": ["QA Sign"]})
+
+
+def test_normalize_header():
+    assert normalize_header("  Item  No’s ") == "item no's"
+    assert normalize_header(None) == ""
+
+
+def test_binding_maps_config_to_sheet_order():
+    b = bind_schema(["Item", "date", "Extra", "QA  Sign"], CFG)
+    assert b.row_from({"Date": "01/02/2024", "Item": "Bolt", "QA Sign": SIGNED}) == ["Bolt", "01/02/2024", "", SIGNED]
+    assert b.missing == ["Qty", "Remarks"] and b.extra == ["Extra"] and not b.order_match
+    assert b.column_of("qa sign") == 4 and b.column_of("Nope") is None
+    assert bind_schema(["Item", "date", "Extra", "QA  Sign"], CFG) is b  # cached
+
+
+def test_diff_config_vs_sheet_reports_matches_after_normalisation():
+    res = diff_config_vs_sheet(CFG, ["date", "Item", "Qty", "Remarks", "QA Sign"])
+    assert res["order_match"] and not res["missing_in_sheet"]
+    assert any("Matched after normalization" in n for n in res["notes"])
+
+
+def test_prepare_import_validates_maps_and_reports():
+    upload = pd.DataFrame({"item": ["Bolt", "Nut", "", "Pin"], "Date": ["01/02/2024", "soon", "", "03/02/2024"],
+                           "Qty": ["1,000", "2", "", "x"], "QA Sign": ["yes", "", "", "maybe"], "Junk": ["a"] * 4})
+    headers = ["Date", "Item", "Qty", "Remarks", "QA Sign"]
+    rows, rejects, notes = prepare_import(upload, CFG, headers)
+    assert rows == [["01/02/2024", "Bolt", "1,000", "", SIGNED]]
+    assert list(rejects.index) == [3, 4, 5]  # upload line numbers
+    assert "bad date in 'Date'" in rejects.loc[3, "Reason"] and rejects.loc[4, "Reason"] == "empty row"
+    assert "bad number in 'Qty'" in rejects.loc[5, "Reason"] and "bad signature" in rejects.loc[5, "Reason"]
+    assert notes == ["Ignored columns: Junk", "Not in file (left blank): Remarks"]
+    fixed = upload.iloc[[1]].assign(Date="", **{"QA Sign": "no"})
+    rows, rejects, _ = prepare_import(fixed, CFG, headers)
+    assert rows == [["", "Nut", "2", "", UNSIGNED]] and rejects.empty
+
+
+def test_prepare_import_accepts_mixed_date_formats():
+    upload = pd.DataFrame({"Date": ["20/03/2024", "2024-03-05"], "Item": ["Bolt", "Nut"]})
+    rows, rejects, _ = prepare_import(upload, CFG, ["Date", "Item"])
+    assert [r[0] for r in rows] == ["20/03/2024", "2024-03-05"] and rejects.empty
+
+
+def test_form_config_is_a_frozen_dict_with_derived_lookups():
+    assert CFG.expected == ("Date", "Item", "Qty", "Remarks", "QA Sign")
+    assert CFG.widgets == ("input", "input", "input", "textarea") and CFG.signature_positions == (4,)
+    with pytest.raises(TypeError): CFG["title"] = "x"
+    with pytest.raises(TypeError): CFG.fields = ()
+    assert json.loads(json.dumps(CFG))["fields"] == list(CFG.fields)
+    clone = pickle.loads(pickle.dumps(CFG))
+    assert clone == CFG and clone.digest == CFG.digest and isinstance(clone, FormConfig)
+
+
+def test_registry_reloads_only_on_change_and_keeps_last_good(tmp_path):
+    path = tmp_path / "forms.json"
+    path.write_text(json.dumps({"A": {"title": "A", "fields": ["x"]}}))
+    reg = ConfigRegistry({"LW FILES": str(path)})
+    first = reg.get("LW FILES")
+    assert reg.get("LW FILES") is first and first["A"].fields == ("x",)
+    path.write_text("{broken")
+    os.utime(path, ns=(1, 2_000_000_000))
+    assert reg.get("LW FILES") is first and "LW FILES" in reg.errors
+    path.write_text(json.dumps({"A": {"title": "A", "fields": ["y"]}}))
+    os.utime(path, ns=(1, 3_000_000_000))
+    assert reg.get("LW FILES")["A"].fields == ("y",) and not reg.errors
+
+
+def test_registry_raises_without_a_good_copy(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ConfigRegistry({"LW FILES": str(tmp_path / "missing.json")}).get("LW FILES")
@@ -0,0 +1,63 @@
+from ims_backend import LocalBackend
+from ims_writes import WriteQueue
+
+
+def make_queue(**kw):
+    backend = LocalBackend("sheet")
+    backend.add_worksheet("A", ["H"]); backend.add_worksheet("B", ["H"])
+    calls = []
+    def append_rows(sheet_name, rows):
+        calls.append((sheet_name, len(rows)))
+        return backend.append_rows(sheet_name, rows)
+    return backend, calls, WriteQueue(append_rows, **kw)
+
+
+def test_rows_for_one_sheet_coalesce_into_one_append():
+    backend, calls, q = make_queue(flush_interval=60)
+    futs = [q.submit("A", [f"r{i}"]) for i in range(3)]
+    assert q.pending("A") == 3
+    q.flush()
+    assert [f.result(5) for f in futs] == [2, 3, 4]
+    assert calls == [("A", 3)] and q.stats["batches"] == 1
+    assert backend.get_values("A") == [["H"], ["r0"], ["r1"], ["r2"]]
+
+
+def test_sheets_are_batched_separately():
+    _, calls, q = make_queue(flush_interval=60)
+    a, b = q.submit("A", ["x"]), q.submit("B", ["y"])
+    q.flush()
+    assert a.result(5) == 2 and b.result(5) == 2
+    assert sorted(calls) == [("A", 1), ("B", 1)]
+
+
+def test_max_batch_flushes_without_waiting_and_splits():
+    _, calls, q = make_queue(flush_interval=60, max_batch=2)
+    futs = [q.submit("A", [i]) for i in range(2)]
+    assert [f.result(5) for f in futs] == [2, 3]  # no flush() needed
+    assert calls == [("A", 2)]
+
+
+def test_interval_flush():
+    _, calls, q = make_queue(flush_interval=0.05)
+    assert q.submit("A", ["x"]).result(5) == 2
+
+
+def test_append_failure_fails_every_future_in_the_batch():
+    q = WriteQueue(lambda name, rows: (_ for _ in ()).throw(RuntimeError("429")), flush_interval=60)
+    futs = [q.submit("A", [i]) for i in range(2)]
+    q.flush()
+    assert all(isinstance(f.exception(5), RuntimeError) for f in futs)
+    assert q.stats["errors"] == 1
+
+
+def test_on_commit_gets_the_committed_rows():
+    commits = []
+    _, _, q = make_queue(flush_interval=60, on_commit=lambda *a: commits.append(a))
+    fut = q.submit("A", ["x"]); q.flush("A")
+    assert fut.result(5) == 2 and commits == [("A", 2, [["x"]])]
+
+
+def test_on_commit_errors_do_not_fail_the_write():
+    _, _, q = make_queue(flush_interval=60, on_commit=lambda *a: 1 / 0)
+    fut = q.submit("A", ["x"]); q.flush()
+    assert fut.result(5) == 2